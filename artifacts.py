@@ -0,0 +1,121 @@
+'''
+Model-and-data artifacts stored as a directory of separate parts.
+
+The classifier from the original study comes as one pickle holding a list:
+the fitted ensemble, X_train, X_test, y_train, y_test, OG_X, OG_y and the
+predictions for OG_X. Unpickling it to reach any one of them reads and
+copies all of them. An artifact directory holds each part in its own file,
+with manifest.json listing them:
+
+    * NumPy arrays (other than object arrays) as .npy files;
+    * data frames, and series as one-column frames, in the cache module's
+      format (a .npy file per column);
+    * anything else, such as the fitted ensemble, pickled.
+
+Artifact reads only the manifest when opened, and each part when it is first
+asked for; arrays and frame columns are memory-mapped, so they cost nothing
+until their pages are touched, and processes mapping the same files share
+those pages. open_parts opens either an artifact directory or an old-style
+pickle, by the same part names. To convert a pickle:
+
+    python artifacts.py weovr_classifier_og_data.pickle [directory]
+'''
+
+# Module imports
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import pandas as pd
+import numpy as np
+import cache
+from pipeline import frame_storable
+
+# Parts of the study's pickle, in its order.
+names = ['model', 'X_train', 'X_test', 'y_train', 'y_test', 'OG_X', 'OG_y',
+    'OG_pred']
+
+def save_part(value, path):
+    # Store one part under path (without extension); returns its manifest
+    # entry.
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        np.save(path + '.npy', value)
+        return {'kind': 'array', 'file': os.path.basename(path) + '.npy',
+            'shape': list(value.shape), 'dtype': str(value.dtype)}
+    if isinstance(value, pd.Series) and \
+        frame_storable(value.to_frame('value')):
+        cache.save_frame(value.to_frame('value'), path)
+        return {'kind': 'series', 'file': os.path.basename(path),
+            'shape': [len(value)], 'name': value.name if
+            isinstance(value.name, (str, int, float)) else None}
+    if isinstance(value, pd.DataFrame) and frame_storable(value):
+        cache.save_frame(value, path)
+        return {'kind': 'frame', 'file': os.path.basename(path),
+            'shape': list(value.shape)}
+    with open(path + '.pkl', 'wb') as f:
+        pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+    return {'kind': 'pickle', 'file': os.path.basename(path) + '.pkl'}
+
+def save_artifact(directory, parts):
+    # Write parts (a dict of name to value) as an artifact directory,
+    # replacing any that is there.
+    tmp = directory.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp, ignore_errors = True)
+    os.makedirs(tmp)
+    manifest = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'parts': {}}
+    for name, value in parts.items():
+        manifest['parts'][name] = save_part(value, os.path.join(tmp, name))
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent = 1)
+    shutil.rmtree(directory, ignore_errors = True)
+    os.replace(tmp, directory)
+
+class Artifact:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.loaded = {}
+
+    def keys(self):
+        return list(self.manifest['parts'])
+
+    def __contains__(self, name):
+        return name in self.manifest['parts']
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            self.loaded[name] = self.load(name)
+        return self.loaded[name]
+
+    def load(self, name):
+        entry = self.manifest['parts'][name]
+        path = os.path.join(self.directory, entry['file'])
+        if entry['kind'] == 'array':
+            return np.load(path, mmap_mode = 'r')
+        if entry['kind'] == 'frame':
+            return cache.load_frame(path)
+        if entry['kind'] == 'series':
+            return cache.load_frame(path)['value'].rename(entry['name'])
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+def open_parts(path):
+    # An artifact directory, or the parts of an old-style pickle by name.
+    if os.path.isdir(path):
+        return Artifact(path)
+    with open(path, 'rb') as f:
+        return dict(zip(names, pickle.load(f)))
+
+def split_pickle(path, directory):
+    save_artifact(directory, open_parts(path))
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+    directory = sys.argv[2] if len(sys.argv) > 2 else \
+        os.path.splitext(path)[0]
+    split_pickle(path, directory)
+    print('%s written, with %s' % (directory,
+        ', '.join(Artifact(directory).keys())))
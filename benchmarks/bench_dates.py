@@ -0,0 +1,57 @@
+'''
+Benchmark: vectorized date composition (dates.py) against the per-row
+strptime loop that data_prep.py used to build DOB, DOD and VISITDATE.
+
+Usage: python benchmarks/bench_dates.py [nrows]
+'''
+
+# Module imports
+import os
+import sys
+import time
+import datetime
+import pandas as pd
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dates import add_dates
+
+def fake_visits(n, seed = 0):
+    # Date parts only, all valid, since the old loop fails on missing codes.
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'BIRTHYR': rng.integers(1900, 1950, n),
+        'BIRTHMO': rng.integers(1, 13, n),
+        'NACCYOD': rng.integers(2005, 2020, n),
+        'NACCMOD': rng.integers(1, 13, n),
+        'VISITYR': rng.integers(2005, 2020, n),
+        'VISITMO': rng.integers(1, 13, n),
+        'VISITDAY': rng.integers(1, 29, n)})
+
+def legacy_dates(aut):
+    # The loop as it stood in data_prep.py.
+    aut = aut.assign(DOB = aut.BIRTHYR)
+    aut = aut.assign(DOD = aut.NACCYOD)
+    aut = aut.assign(VISITDATE = aut.VISITYR)
+    for i in range(aut.shape[0]):
+        aut.loc[i,'DOB'] = datetime.datetime.strptime('-'.join([str(aut.BIRTHYR.loc[i]),str(aut.BIRTHMO.loc[i]),'01']),'%Y-%m-%d')
+        aut.loc[i,'DOD'] = datetime.datetime.strptime('-'.join([str(aut.NACCYOD.loc[i]),str(aut.NACCMOD.loc[i]),'01']),'%Y-%m-%d')
+        aut.loc[i,'VISITDATE'] = datetime.datetime.strptime('-'.join([str(aut.VISITYR.loc[i]),str(aut.VISITMO.loc[i]),str(aut.VISITDAY.loc[i])]),'%Y-%m-%d')
+    return aut
+
+def timed(f, *args):
+    t = time.perf_counter()
+    out = f(*args)
+    return out, time.perf_counter() - t
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    aut = fake_visits(n)
+    old, told = timed(legacy_dates, aut)
+    new, tnew = timed(add_dates, aut)
+    for v in ['DOB', 'DOD', 'VISITDATE']:
+        assert (pd.to_datetime(old[v]) == new[v]).all(), v
+    print('rows: %d' % n)
+    print('strptime loop: %8.3f s' % told)
+    print('vectorized:    %8.3f s  (%.0fx)' % (tnew, told / tnew))
+    big = fake_visits(100 * n)
+    _, tbig = timed(add_dates, big)
+    print('vectorized, %d rows: %.3f s' % (100 * n, tbig))
@@ -0,0 +1,117 @@
+'''
+Benchmark: time and peak memory of each stage of data_prep.py, on synthetic
+visits (see synthetic.py) at several scales.
+
+Each scale runs in a scratch directory with an empty cache, so every stage
+is computed, and stages run one at a time so that each peak is the stage's
+own. Peak memory is the peak of Python-level allocations (tracemalloc, which
+NumPy and pandas report to) above what was held when the stage started;
+worker processes of the correlation screen are not counted, and tracing
+slows the pipeline down somewhat. The error-analysis stages need the
+classifier from the original study and are left out.
+
+With --baseline, stages more than --tolerance times slower than in an
+earlier run saved with --out are listed and the exit status is 1. Stages
+taking under a tenth of a second are too noisy to compare and are ignored.
+
+Usage: python benchmarks/bench_stages.py [nrows ...] [--out results.csv]
+    [--baseline results.csv] [--tolerance 1.5] [--seed 0]
+'''
+
+# Module imports
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import pandas as pd
+import numpy as np
+here = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, here)
+from synthetic import write_visits
+from pipeline import Stage, Pipeline, value_bytes
+# Imported here so that import time is not charged to the first stage using
+# them.
+import sklearn.impute, sklearn.preprocessing, sklearn.model_selection
+
+# Stages left out (they need the original study's classifier).
+skipped = ['errors', 'tables']
+
+class TimedStage(Stage):
+    def __init__(self, st, log):
+        super().__init__(st.func, st.outputs, st.memo)
+        self.log = log
+
+    def __call__(self, values):
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        t = time.perf_counter()
+        out = super().__call__(values)
+        seconds = time.perf_counter() - t
+        peak = tracemalloc.get_traced_memory()[1] - held
+        self.log.append({'stage': self.name, 'seconds': seconds,
+            'peak_MB': peak / 2**20,
+            'out_MB': sum(value_bytes(x) for x in out.values()) / 2**20})
+        return out
+
+def bench(n, seed = 0):
+    # Per-stage results for n synthetic visits.
+    import data_prep
+    work = tempfile.mkdtemp(prefix = 'bench_stages_')
+    cwd = os.getcwd()
+    try:
+        shutil.copy(os.path.join(here, 'xvar.csv'), work)
+        shutil.copy(os.path.join(here, 'harmonize.csv'), work)
+        os.chdir(work)
+        t = time.perf_counter()
+        write_visits('investigator.csv', n, seed = seed)
+        log = [{'stage': '(generate)', 'seconds': time.perf_counter() - t,
+            'peak_MB': np.nan, 'out_MB': os.path.getsize('investigator.csv') / 2**20}]
+        stages = [TimedStage(st, log) for st in data_prep.stages
+            if st.name not in skipped]
+        pipeline = Pipeline(stages, cache_dir = 'cache', nproc = 1)
+        tracemalloc.start()
+        try:
+            pipeline.run(investigator = 'investigator.csv',
+                xvar_path = 'xvar.csv', harmonize_path = 'harmonize.csv',
+                coding = 'corrected', cache_dir = 'cache', out_dir = '.')
+        finally:
+            tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors = True)
+    report = pd.DataFrame(log)
+    report.insert(0, 'nrows', n)
+    return report
+
+def regressions(report, baseline, tolerance, min_seconds = 0.1):
+    both = report.merge(baseline, on = ['nrows', 'stage'],
+        suffixes = ('', '_baseline'))
+    both['ratio'] = both.seconds / both.seconds_baseline
+    slow = (both.ratio > tolerance) & (both.seconds >= min_seconds)
+    return both.loc[slow, ['nrows', 'stage', 'seconds', 'seconds_baseline',
+        'ratio']]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('nrows', nargs = '*', type = int,
+        default = [10000, 100000])
+    parser.add_argument('--out')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type = float, default = 1.5)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    report = pd.concat([bench(n, args.seed) for n in args.nrows],
+        ignore_index = True)
+    with pd.option_context('display.width', 120):
+        print(report.round(3).to_string(index = False))
+    if args.out:
+        report.to_csv(args.out, index = False)
+    if args.baseline:
+        slow = regressions(report, pd.read_csv(args.baseline), args.tolerance)
+        if len(slow):
+            print('\nSlower than the baseline:')
+            print(slow.round(3).to_string(index = False))
+            sys.exit(1)
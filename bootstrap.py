@@ -0,0 +1,113 @@
+'''
+Bootstrap confidence intervals for classification metrics.
+
+Visits of one participant are not independent, so resampling is by
+participant: each resample draws participants with replacement, as many
+from each true class as there are (stratified), and takes all their visits.
+The draws for all resamples form one index matrix (resamples by
+participants). Counting how often each participant is drawn in each
+resample is one bincount over combined (resample, participant) codes, and
+since a confusion matrix is a sum over visits, the confusion matrices of all
+resamples are the product of those counts with each participant's own
+confusion counts (a bincount over combined true and predicted class codes).
+Recall, precision and F1 per class, balanced accuracy and accuracy then
+follow for all resamples at once, and percentiles of them give the
+intervals. Resamples are done in blocks to bound memory; there is no loop
+over single resamples.
+'''
+
+# Module imports
+import warnings
+import pandas as pd
+import numpy as np
+
+def subject_counts(true, pred, groups, k):
+    # Each participant's confusion counts (participants by k*k), with the
+    # participants' codes and their true classes (of the first visit).
+    sub, subjects = pd.factorize(pd.Series(groups))
+    counts = np.bincount(sub * k * k + true * k + pred,
+        minlength = len(subjects) * k * k).reshape(len(subjects), k * k)
+    first = np.unique(sub, return_index = True)[1]
+    return counts.astype('float64'), true[first]
+
+def resample_index(strata, nboot, rng):
+    # Index matrix (nboot by participants) of participants drawn within
+    # their stratum.
+    cols = []
+    for s in np.unique(strata):
+        members = np.flatnonzero(strata == s)
+        cols.append(members[rng.integers(0, len(members),
+            (nboot, len(members)))])
+    return np.hstack(cols)
+
+def bootstrap_confusion(true, pred, groups, k, nboot = 10000, seed = 0,
+    block = 2000):
+    # Confusion matrices (nboot by k by k) of participant-level stratified
+    # resamples.
+    rng = np.random.default_rng(seed)
+    counts, strata = subject_counts(true, pred, groups, k)
+    m = counts.shape[0]
+    out = np.empty((nboot, k * k))
+    for b0 in range(0, nboot, block):
+        nb = min(block, nboot - b0)
+        idx = resample_index(strata, nb, rng)
+        draws = np.bincount((np.arange(nb)[:,None] * m + idx).ravel(),
+            minlength = nb * m).reshape(nb, m)
+        out[b0:b0 + nb] = draws @ counts
+    return out.reshape(nboot, k, k)
+
+def metric_values(C):
+    # Metrics of confusion matrices C (... by k by k, true by predicted).
+    diag = np.diagonal(C, axis1 = -2, axis2 = -1)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        recall = diag / C.sum(axis = -1)
+        precision = diag / C.sum(axis = -2)
+        f1 = 2 * precision * recall / (precision + recall)
+        f1 = np.where((precision + recall) == 0, 0, f1)
+        accuracy = diag.sum(axis = -1) / C.sum(axis = (-2, -1))
+    return {'recall': recall, 'precision': precision, 'f1': f1,
+        'balanced_accuracy': np.nanmean(recall, axis = -1),
+        'accuracy': accuracy}
+
+def bootstrap_cis(true, pred, groups, classes = None, nboot = 10000,
+    alpha = 0.05, seed = 0):
+    # Point estimates and percentile intervals of the metrics, one row per
+    # metric and class (class blank for the overall metrics), and the
+    # confusion matrix with the intervals of each of its cells. Given
+    # classes (names), the labels are their codes 0, 1, ..., whether or not
+    # each turns up; otherwise they are the labels found.
+    true = np.asarray(true)
+    pred = np.asarray(pred)
+    if classes is None:
+        labels = np.unique(np.concatenate([true, pred]))
+        classes = list(labels)
+    else:
+        classes = list(classes)
+        labels = np.arange(len(classes))
+        if not (np.isin(true, labels).all() and np.isin(pred, labels).all()):
+            raise ValueError('labels must be codes 0 to %d for the %d classes'
+                % (len(classes) - 1, len(classes)))
+    k = len(labels)
+    t, p = np.searchsorted(labels, true), np.searchsorted(labels, pred)
+    point = np.bincount(t * k + p, minlength = k * k).reshape(k, k)
+    C = bootstrap_confusion(t, p, groups, k, nboot, seed)
+    q = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    est, boot = metric_values(point.astype('float64')), metric_values(C)
+    rows = []
+    for name, values in boot.items():
+        # Metrics of a class that never turns up are NaN throughout.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lo, hi = np.nanpercentile(values, q, axis = 0)
+        if values.ndim == 1:
+            rows.append((name, '', est[name], lo, hi))
+        else:
+            rows += [(name, c, est[name][j], lo[j], hi[j])
+                for j, c in enumerate(classes)]
+    table = pd.DataFrame(rows, columns = ['metric', 'class', 'estimate',
+        'lower', 'upper'])
+    lo, hi = np.percentile(C, q, axis = 0)
+    confusion = pd.DataFrame({'count': point.ravel(), 'lower': lo.ravel(),
+        'upper': hi.ravel()}, index = pd.MultiIndex.from_product([classes,
+        classes], names = ['true', 'pred']))
+    return table, confusion
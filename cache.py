@@ -0,0 +1,104 @@
+'''
+On-disk cache for data frames, stored one column per .npy file.
+
+Numeric, Boolean and datetime columns are saved as plain NumPy arrays and
+memory-mapped on reload, so a cached frame is back in well under a second and
+its pages are only read when a column is touched. Text and categorical
+columns are stored as integer codes plus a list of categories in the
+manifest; text comes back as object columns, categoricals as categoricals.
+
+Cache entries are keyed by a hash of everything that went into them (see
+cache_key); a stale entry is simply never looked up again.
+'''
+
+# Module imports
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+import numpy as np
+
+def file_digest(path):
+    # Content hash of a file. Hashing the 340 MB investigator file takes a
+    # while, so the digest is remembered in a sidecar file next to it and
+    # reused for as long as the file's size and modification time match.
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    sidecar = path + '.digest'
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            saved = json.load(f)
+        if saved['stamp'] == stamp:
+            return saved['digest']
+    h = hashlib.blake2b(digest_size = 20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    try:
+        with open(sidecar, 'w') as f:
+            json.dump({'stamp': stamp, 'digest': digest}, f)
+    except OSError:
+        pass
+    return digest
+
+def cache_key(*parts):
+    # Combine file digests, source code and settings into one key.
+    h = hashlib.blake2b(digest_size = 20)
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode()
+        h.update(hashlib.blake2b(part, digest_size = 20).digest())
+    return h.hexdigest()
+
+def save_frame(df, path):
+    # Write to a scratch directory first so that an interrupted run never
+    # leaves a half-written entry behind.
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors = True)
+    os.makedirs(tmp)
+    manifest = {'nrows': int(df.shape[0]), 'columns': []}
+    for i, v in enumerate(df.columns):
+        col = df[v]
+        entry = {'name': v, 'file': '%04d.npy' % i}
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(tmp, entry['file']),
+                col.cat.codes.to_numpy())
+            entry['kind'] = 'category'
+            entry['categories'] = [str(c) for c in col.cat.categories]
+            entry['ordered'] = bool(col.cat.ordered)
+        elif col.dtype == object or isinstance(col.dtype, pd.StringDtype):
+            codes, cats = pd.factorize(col)
+            np.save(os.path.join(tmp, entry['file']), codes.astype('int32'))
+            entry['kind'] = 'text'
+            entry['categories'] = [str(c) for c in cats]
+        else:
+            np.save(os.path.join(tmp, entry['file']), col.to_numpy())
+            entry['kind'] = 'array'
+        manifest['columns'].append(entry)
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(path, ignore_errors = True)
+    os.replace(tmp, path)
+
+def load_frame(path):
+    # Columns are mapped copy-on-write: they share pages with the cache
+    # files until a column is modified in place.
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    cols = {}
+    for entry in manifest['columns']:
+        arr = np.load(os.path.join(path, entry['file']), mmap_mode = 'c')
+        if entry['kind'] == 'text':
+            cats = np.array(entry['categories'] + [np.nan], dtype = object)
+            arr = cats[arr]
+        elif entry['kind'] == 'category':
+            arr = pd.Categorical.from_codes(arr, entry['categories'],
+                ordered = entry['ordered'])
+        cols[entry['name']] = arr
+    return pd.DataFrame(cols, index = pd.RangeIndex(manifest['nrows']),
+        copy = False)
+
+def has_frame(path):
+    return os.path.exists(os.path.join(path, 'manifest.json'))
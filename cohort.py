@@ -0,0 +1,176 @@
+'''
+Chunked loader for the NACC investigator file, and coding of pathology class
+outcomes for the autopsy cohort.
+
+Only the columns named in xvar.csv, the npvar table and the identifier/date
+fields are read, with dtypes declared up front so that pandas does not have
+to infer them. The autopsy and exclusion filters are applied to each chunk as
+it is read, so peak memory scales with the autopsy cohort rather than with
+the full NACC freeze.
+
+load_cohort caches the class-coded cohort on disk (see cache.py), with the
+keys and hashes of every visit read (see freeze.py). The entry is
+keyed by the investigator file, xvar.csv, the class coding and the source of
+this module, variables.py, pathrules.py and dtypes.py, so editing the
+selection or coding rules or the dtype plan invalidates it.
+
+Reading, the per-chunk exclusion filter and class coding are marked as steps
+for instrument.py.
+'''
+
+# Module imports
+import os
+import pandas as pd
+import numpy as np
+from variables import npvar, idvar, datevar, selectvar, textvar
+import cache
+from pathrules import compile_rules, rulesets
+from dtypes import dtype_plan, apply_plan, code_dtype
+from dates import compose_dates
+from instrument import step
+
+# The class codings of pathrules.py, compiled, by name; 'corrected' is the
+# default.
+codings = {name: compile_rules(rules) for name, rules in rulesets.items()}
+classrules = codings['corrected']
+
+# Columns coded from the pathology rules; everything else in the cohort is
+# raw data.
+outcomes = ['Class', *[flag for flag, code in classrules.order]]
+
+def visit_keys(frame):
+    # (NACCID, VISITDATE) for each row, composing the date if need be.
+    if 'VISITDATE' in frame.columns:
+        date = frame.VISITDATE.to_numpy()
+    else:
+        date = compose_dates(frame.VISITYR, frame.VISITMO, frame.VISITDAY)
+    return pd.MultiIndex.from_arrays([frame.NACCID.to_numpy(), date],
+        names = ['NACCID', 'VISITDATE'])
+
+def visit_digests(frame):
+    # Keys and a 64-bit hash of the raw values of each visit. Columns are
+    # taken in name order and numbers as float64, so the hash does not
+    # depend on column order or on which columns came back as integers.
+    digest = np.zeros(frame.shape[0], dtype = 'uint64')
+    with np.errstate(over = 'ignore'):
+        for v in sorted(c for c in frame.columns if c not in outcomes and
+            c not in ['VISITDATE', 'DOB', 'DOD']):
+            x = frame[v].to_numpy()
+            if x.dtype.kind in 'iufb':
+                x = x.astype('float64')
+            digest = digest * np.uint64(1000003) ^ pd.util.hash_array(x)
+    keys = visit_keys(frame)
+    seen = keys.to_frame(index = False)
+    seen['digest'] = digest
+    if keys.has_duplicates:
+        raise ValueError('visits are not unique by NACCID and VISITDATE')
+    return seen
+
+# Exclusion criteria: participants with any of these codes are dropped.
+# Down's syndrome, Huntington's and prion disease are coded as present (1);
+# MSA, neoplasm and schizophrenia count as present if primary, contributing
+# or non-contributing (1, 2, 3).
+exclusions = [('DOWNS',[1]),
+    ('HUNT',[1]),
+    ('PRION',[1]),
+    ('MSAIF',[1,2,3]),
+    ('NEOPIF',[1,2,3]),
+    ('SCHIZOIF',[1,2,3])]
+
+def cohort_columns(header, xvar):
+    # Columns to read, in the order they appear in the file.
+    wanted = set(xvar.Variable) | set(npvar.Variable) | set(idvar) | \
+        set(datevar) | set(selectvar)
+    return [v for v in header if v in wanted]
+
+def cohort_dtypes(columns):
+    # Free text is read as strings and date parts as integers; everything
+    # else is a numeric code, which may be missing.
+    dtypes = {}
+    for v in columns:
+        if v in textvar:
+            dtypes[v] = str
+        elif v in datevar:
+            dtypes[v] = 'int64'
+        else:
+            dtypes[v] = 'float64'
+    return dtypes
+
+def keep_rows(chunk):
+    # Include only those with autopsy data, then apply the exclusions.
+    keep = (chunk.NACCAUTP == 1).to_numpy()
+    for v, codes in exclusions:
+        keep &= ~chunk[v].isin(codes).to_numpy()
+    return keep
+
+def read_chunks(path, xvar, chunksize = 10000):
+    # The cohort's rows of the investigator file, chunk by chunk.
+    header = pd.read_csv(path, nrows = 0).columns
+    columns = cohort_columns(header, xvar)
+    plan = dtype_plan(xvar)
+    reader = pd.read_csv(path, usecols = columns,
+        dtype = cohort_dtypes(columns), chunksize = chunksize)
+    # Planned code columns go to float32 chunk by chunk (exact for integer
+    # codes), so the full cohort is never held as float64.
+    small = [v for v in columns if plan.get(v) == 'code']
+    for chunk in reader:
+        with step('exclusions', chunk) as s:
+            chunk = chunk.loc[keep_rows(chunk)].astype(dict.fromkeys(small,
+                'float32'))
+            s.output(chunk)
+        yield chunk
+
+def read_cohort(path, xvar, chunksize = 10000):
+    plan = dtype_plan(xvar)
+    aut = pd.concat(read_chunks(path, xvar, chunksize), ignore_index = True)
+    columns = list(aut.columns)
+    # Codes are declared as float since any of them may be missing. Other
+    # columns that turn out to be complete integers within the cohort go
+    # back to integers, the smallest type that holds them; planned columns
+    # get their dtypes from the plan (see dtypes.py).
+    numvar = [v for v in columns if v not in textvar and v not in datevar
+        and v not in plan]
+    block = aut[numvar].to_numpy()
+    isint = ~np.isnan(block).any(axis = 0) & (block == np.floor(block)).all(axis = 0)
+    aut = aut.assign(**{v: block[:,j].astype(code_dtype(block[:,j]))
+        for j, v in enumerate(numvar) if isint[j]})
+    return apply_plan(aut, plan)
+
+def code_classes(aut, coding = 'corrected'):
+    # Code the pathology flags and Class from the rules in pathrules.py, then
+    # keep only cases with one of the pathology classes of interest.
+    aut = codings[coding].apply(aut)
+    aut = aut.loc[aut.Class != 0]
+    aut.index = list(range(aut.shape[0]))
+    return aut
+
+def load_cohort(path, xvar_path = 'xvar.csv', cache_dir = 'cache',
+    coding = 'corrected'):
+    # The selected, class-coded cohort, limited to cases with one of the
+    # pathology classes of interest (Class != 0), and visit_digests of the
+    # whole cohort as read, Class 0 included, which freeze.py compares the
+    # next freeze with. coding names the class coding (see pathrules.py).
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(xvar_path, 'rb') as f:
+        xvar_bytes = f.read()
+    sources = []
+    for name in ['cohort.py', 'variables.py', 'pathrules.py', 'dtypes.py']:
+        with open(os.path.join(here, name), 'rb') as f:
+            sources.append(f.read())
+    key = cache.cache_key(cache.file_digest(path), xvar_bytes, *sources,
+        coding.encode())
+    entry = os.path.join(cache_dir, 'cohort-' + key)
+    if cache.has_frame(entry) and cache.has_frame(entry + '-seen'):
+        return cache.load_frame(entry), cache.load_frame(entry + '-seen')
+    xvar = pd.read_csv(xvar_path)
+    with step('read cohort') as s:
+        aut = read_cohort(path, xvar)
+        s.output(aut)
+    seen = visit_digests(aut)
+    with step('class coding', aut) as s:
+        aut = code_classes(aut, coding)
+        s.output(aut)
+    os.makedirs(cache_dir, exist_ok = True)
+    cache.save_frame(aut, entry)
+    cache.save_frame(seen, entry + '-seen')
+    return aut, seen
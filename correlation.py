@@ -0,0 +1,122 @@
+'''
+Thresholded correlation screening for redundant variables.
+
+Pairwise-complete Pearson correlations (each pair uses the rows where both
+variables are observed, as in DataFrame.corr) are computed from a handful of
+matrix products on a float32 block: with M the 0/1 mask of observed values
+and X the values with missing entries set to 0, the counts, sums, sums of
+squares and cross-products for every pair of columns are M'M, X'M, (X*X)'M
+and X'X. The columns are split into blocks and the block pairs are spread
+over a process pool, or over threads when other threads are running (as in
+the pipeline's thread pool), since forking then is not safe; only pairs above
+the threshold come back.
+
+resolve_pairs then turns the pairs into a drop list: going from the
+strongest correlation down, of each pair whose variables are both still in,
+the one with fewer observations is dropped (ties go to the later column).
+'''
+
+# Module imports
+import os
+import threading
+import multiprocessing
+import concurrent.futures
+import pandas as pd
+import numpy as np
+
+# Block shared with worker processes, set by share_block.
+shared = {}
+
+def share_block(X, M):
+    shared['X'] = X
+    shared['M'] = M
+
+def block_pairs(task):
+    # Correlations between columns i0:i1 and j0:j1, keeping those above the
+    # threshold (and for the diagonal blocks, only those above the diagonal).
+    i0, i1, j0, j1, threshold, min_periods = task
+    X, M = shared['X'], shared['M']
+    Xa, Ma, Xb, Mb = X[:,i0:i1], M[:,i0:i1], X[:,j0:j1], M[:,j0:j1]
+    n = Ma.T @ Mb
+    sx = Xa.T @ Mb
+    sy = Ma.T @ Xb
+    sxx = (Xa * Xa).T @ Mb
+    syy = Ma.T @ (Xb * Xb)
+    sxy = Xa.T @ Xb
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cov = sxy - sx * sy / n
+        var = (sxx - sx * sx / n) * (syy - sy * sy / n)
+        r = cov / np.sqrt(var)
+    keep = (np.abs(r) > threshold) & (n >= min_periods) & (var > 0)
+    if i0 == j0:
+        keep &= np.triu(np.ones(keep.shape, dtype = bool), k = 1)
+    ii, jj = np.nonzero(keep)
+    return ii + i0, jj + j0, np.clip(r[ii, jj], -1, 1), n[ii, jj]
+
+def corr_pairs(frame, threshold = 0.8, blocksize = 256, nproc = None,
+    min_periods = 1):
+    # Pairs of columns of frame with |r| > threshold, strongest first.
+    X = frame.to_numpy(dtype = 'float64')
+    M = ~np.isnan(X)
+    # Correlation does not depend on location or scale; standardizing first
+    # keeps the float32 sums well conditioned.
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mu = np.nanmean(X, axis = 0)
+        sd = np.nanstd(X, axis = 0)
+    sd[~(sd > 0)] = 1
+    mu[np.isnan(mu)] = 0
+    X = np.where(M, (X - mu) / sd, 0).astype('float32')
+    M = M.astype('float32')
+    p = X.shape[1]
+    starts = list(range(0, p, blocksize))
+    tasks = [(i, min(i + blocksize, p), j, min(j + blocksize, p), threshold,
+        min_periods) for i in starts for j in starts if j >= i]
+    if nproc is None:
+        nproc = min(os.cpu_count() or 1, len(tasks))
+    share_block(X, M)
+    try:
+        if nproc > 1 and threading.active_count() > 1:
+            # Forking a process with other threads running (such as the
+            # pipeline's other stages) can leave a lock held in the child for
+            # good. The matrix products release the GIL, so threads sharing
+            # the block do about as well.
+            with concurrent.futures.ThreadPoolExecutor(nproc) as pool:
+                results = list(pool.map(block_pairs, tasks))
+        elif nproc > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            # Forked workers see the block without it being pickled.
+            with multiprocessing.get_context('fork').Pool(nproc) as pool:
+                results = pool.map(block_pairs, tasks)
+        elif nproc > 1:
+            with multiprocessing.Pool(nproc, initializer = share_block,
+                initargs = (X, M)) as pool:
+                results = pool.map(block_pairs, tasks)
+        else:
+            results = [block_pairs(t) for t in tasks]
+    finally:
+        shared.clear()
+    ii = np.concatenate([res[0] for res in results])
+    jj = np.concatenate([res[1] for res in results])
+    cols = np.asarray(frame.columns)
+    acs = pd.DataFrame({'v1': cols[ii], 'v2': cols[jj],
+        'r': np.concatenate([res[2] for res in results]).astype('float64'),
+        'n': np.concatenate([res[3] for res in results]).astype('int64')})
+    order = np.lexsort((jj, ii, -np.abs(acs.r.to_numpy())))
+    return acs.iloc[order].reset_index(drop = True)
+
+def resolve_pairs(acs, counts):
+    # Variables to drop so that no pair in acs has both variables left.
+    # counts: non-null count per variable; the order of its index breaks
+    # ties, the later variable being dropped.
+    rank = {v: i for i, v in enumerate(counts.index)}
+    dropped = []
+    gone = set()
+    for v1, v2 in zip(acs.v1, acs.v2):
+        if v1 in gone or v2 in gone:
+            continue
+        if (counts[v1], -rank[v1]) >= (counts[v2], -rank[v2]):
+            drop = v2
+        else:
+            drop = v1
+        gone.add(drop)
+        dropped.append(drop)
+    return dropped
@@ -0,0 +1,82 @@
+'''
+Vectorized construction of date and interval variables.
+
+Dates are composed from their year/month/day parts in one pass over whole
+columns using NumPy datetime arithmetic. Parts that are missing codes (-4,
+88, 99, 8888, 9999, ...) or otherwise out of range give NaT rather than an
+error.
+
+Derived intervals are listed in a declarative table: each is the difference
+between two variables, after that variable's missing-data codes have been
+set to NaN.
+'''
+
+# Module imports
+import numpy as np
+
+# Date variables and the year, month and day variables they are composed
+# from. Where no day is recorded the first of the month is used.
+datespec = [('DOB', 'BIRTHYR', 'BIRTHMO', None),
+    ('DOD', 'NACCYOD', 'NACCMOD', None),
+    ('VISITDATE', 'VISITYR', 'VISITMO', 'VISITDAY')]
+
+# Missing-data codes for the variables intervals are computed from.
+yearcodes = (-4, 8888, 9999)
+agecodes = (-4, 888, 999)
+
+# Interval variables: name, then the variables whose difference it is
+# (first minus second), each with its missing-data codes.
+intervalspec = [('SinceQUITSMOK', ('NACCAGE', ()), ('QUITSMOK', agecodes)), # Years since quitting smoking
+    ('AgeStroke', ('NACCSTYR', yearcodes), ('BIRTHYR', ())),
+    ('AgeTIA', ('NACCTIYR', yearcodes), ('BIRTHYR', ())),
+    ('AgePD', ('PDYR', yearcodes), ('BIRTHYR', ())),
+    ('AgePDOTHR', ('PDOTHRYR', yearcodes), ('BIRTHYR', ())),
+    ('AgeTBI', ('TBIYEAR', yearcodes), ('BIRTHYR', ())),
+    ('Duration', ('NACCAGE', ()), ('DECAGE', agecodes))]
+
+def compose_dates(year, month, day = None, minyear = 1800, maxyear = 2100):
+    # Build datetime64 values from arrays of date parts. Anything that is not
+    # a real calendar date comes out as NaT.
+    year = np.asarray(year, dtype = 'float64')
+    month = np.asarray(month, dtype = 'float64')
+    if day is None:
+        day = np.ones_like(year)
+    day = np.asarray(day, dtype = 'float64')
+    valid = (year >= minyear) & (year < maxyear) & (month >= 1) & \
+        (month <= 12) & (day >= 1) & (day <= 31)
+    valid &= (year == np.floor(year)) & (month == np.floor(month)) & \
+        (day == np.floor(day))
+    y = np.where(valid, year, 1970).astype('int64')
+    m = np.where(valid, month, 1).astype('int64')
+    d = np.where(valid, day, 1).astype('int64')
+    first = ((y - 1970) * 12 + (m - 1)).astype('datetime64[M]')
+    # Days past the end of the month (e.g. 31 April) are not valid dates.
+    monthlen = ((first + 1).astype('datetime64[D]') - \
+        first.astype('datetime64[D]')).astype('int64')
+    valid &= d <= monthlen
+    out = (first.astype('datetime64[D]') + (d - 1)).astype('datetime64[ns]')
+    out[~valid] = np.datetime64('NaT')
+    return out
+
+def masked(frame, v, codes):
+    # A variable as float, with its missing-data codes set to NaN.
+    x = frame[v].to_numpy(dtype = 'float64', na_value = np.nan)
+    if len(codes) > 0:
+        x = np.where(np.isin(x, codes), np.nan, x)
+    return x
+
+def add_dates(frame, spec = datespec):
+    cols = {}
+    for name, yv, mv, dv in spec:
+        day = None if dv is None else frame[dv].to_numpy(dtype = 'float64',
+            na_value = np.nan)
+        cols[name] = compose_dates(frame[yv].to_numpy(dtype = 'float64',
+            na_value = np.nan), frame[mv].to_numpy(dtype = 'float64',
+            na_value = np.nan), day)
+    return frame.assign(**cols)
+
+def add_intervals(frame, spec = intervalspec):
+    cols = {}
+    for name, (v1, codes1), (v2, codes2) in spec:
+        cols[name] = masked(frame, v1, codes1) - masked(frame, v2, codes2)
+    return frame.assign(**cols)
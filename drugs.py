@@ -0,0 +1,77 @@
+'''
+Sparse multi-hot coding of reported medications.
+
+Each visit lists up to 40 drug names in DRUG1..DRUG40. Names are normalized
+once per distinct string: lowercased, corrected for spelling variants with a
+single compiled pattern, and split into tokens on '-' and '/', so that
+combination products count towards each of their components. The result is
+a visits x tokens CSR matrix of 0/1 values aligned with the rows of the
+cohort frame, with the token vocabulary as its column index.
+'''
+
+# Module imports
+import re
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from variables import drugvar
+
+# Spelling variants, and hyphens that are part of a name rather than joining
+# two drugs. Several varieties of insulin--important to distinguish?
+drug_corrections = [("multivitamin with minerals","multivitamin"),
+    ("multivitamin, prenatal","multivitamin"),
+    ("omega 3-6-9","omega369"),
+    ("omega-3","omega3"),
+    ("vitamin-d","vitamin d"),
+    ("acetyl-l-carnitine","acetyl l carnitine"),
+    ("levodopa","levadopa"),
+    ("pro-stat","prostat"),
+    ("alpha-d-galactosidase","alpha d galactosidase"),
+    ("indium pentetate in-111","indium pentetate in111"),
+    ("fludeoxyglucose f-18","fludeoxyglucose f18"),
+    ("calcium with vitamins d and k", "calcium-vitamin d-vitamin k"),
+    ("aloe vera topical", "aloe vera"),
+    ("ammonium lactate topical", "ammonium lactate")]
+
+# Entries that are not a drug, or too generic to be useful.
+drug_dropped = ["*not codable*",
+    "diphtheria/hepb/pertussis,acel/polio/tetanus"]
+
+def compile_corrections(corrections = drug_corrections):
+    # One alternation, longest pattern first, replaces every variant in a
+    # single pass over the string.
+    lookup = dict(corrections)
+    pattern = re.compile('|'.join(re.escape(old) for old in
+        sorted(lookup, key = len, reverse = True)))
+    return lambda name: pattern.sub(lambda m: lookup[m.group(0)], name)
+
+def drug_tokens(name, correct):
+    name = name.lower()
+    if name in drug_dropped:
+        return []
+    name = correct(name)
+    tokens = [t.strip() for part in name.split('-') for t in part.split('/')]
+    return [t for t in tokens if t]
+
+def drug_matrix(aut, drugcols = drugvar, corrections = drug_corrections):
+    # Returns the visits x tokens matrix and the token vocabulary (sorted).
+    correct = compile_corrections(corrections)
+    names = aut[drugcols].to_numpy(dtype = object).ravel()
+    codes, uniques = pd.factorize(names)
+    tokens = [drug_tokens(str(u), correct) for u in uniques]
+    vocab = np.array(sorted(set(t for tt in tokens for t in tt)), dtype = object)
+    index = {t: j for j, t in enumerate(vocab)}
+    # Distinct names x tokens, then visits x distinct names; their product
+    # is visits x tokens.
+    lengths = np.array([len(tt) for tt in tokens], dtype = 'int64')
+    names_tokens = sparse.csr_matrix((np.ones(lengths.sum(), dtype = 'int32'),
+        np.array([index[t] for tt in tokens for t in tt], dtype = 'int64'),
+        np.concatenate([[0], np.cumsum(lengths)])),
+        shape = (len(uniques), len(vocab)))
+    rows = np.repeat(np.arange(aut.shape[0]), len(drugcols))
+    found = codes >= 0
+    visits_names = sparse.csr_matrix((np.ones(found.sum(), dtype = 'int32'),
+        (rows[found], codes[found])), shape = (aut.shape[0], len(uniques)))
+    X = (visits_names @ names_tokens).tocsr()
+    X.data[:] = 1
+    return X.astype('uint8'), vocab
@@ -0,0 +1,91 @@
+'''
+Storage dtypes for the cohort frame, planned from xvar.csv.
+
+Most UDS variables are small integer codes, and holding each of them as
+int64 or float64 takes 8 bytes per visit where 1 or 2 would do. The plan
+follows the Type column of xvar.csv:
+
+    * Boolean, Ordinal and Nominal variables are codes: the smallest signed
+      integer type that holds the column's values (int8 for nearly all of
+      them, int16 where a code such as 888 turns up), or float32 where the
+      column has blanks. float32 holds integer codes exactly, and NaN.
+    * Numeric variables are float64. Many are decimals (BMI, say), which
+      float32 would round before imputation and scaling.
+    * Free-text variables are categorical.
+
+Untyped variables (the neuropathology table and variables not used as
+predictors) are stored the same way as codes when they are complete integers,
+and as float64 otherwise; date parts stay int64.
+
+The dtypes carry through the later steps: masking missing-data codes turns
+an integer column into float32 rather than float64 (see nancodes.py), and
+the _couldnt dummies are uint8. Nominal variables stay integer codes rather
+than categoricals, since their missing-data codes are masked and the one-hot
+encoder fills them with 0; the codes take one byte per visit either way.
+'''
+
+# Module imports
+import pandas as pd
+import numpy as np
+from variables import textvar
+
+# Storage class for each Type in xvar.csv.
+typeplan = {'Boolean': 'code', 'Ordinal': 'code', 'Nominal': 'code',
+    'Numeric': 'float64'}
+
+def dtype_plan(xvar):
+    # Storage class ('code', 'float64' or 'category') by variable.
+    plan = {}
+    for v, t in zip(xvar.Variable, xvar.Type):
+        if t in typeplan:
+            plan[v] = typeplan[t]
+    for v in textvar:
+        plan[v] = 'category'
+    return plan
+
+def code_dtype(x):
+    # Smallest signed integer dtype for a column of integer codes, or
+    # float32 if it has blanks or fractions.
+    x = np.asarray(x, dtype = 'float64')
+    if np.isnan(x).any() or (x != np.floor(x)).any():
+        return np.dtype('float32')
+    if x.size == 0:
+        return np.dtype('int8')
+    lo, hi = x.min(), x.max()
+    for dt in ['int8', 'int16', 'int32']:
+        info = np.iinfo(dt)
+        if lo >= info.min and hi <= info.max:
+            return np.dtype(dt)
+    return np.dtype('int64')
+
+def apply_plan(frame, plan):
+    # frame with its planned columns converted.
+    cols = {}
+    for v in frame.columns:
+        kind = plan.get(v)
+        if kind == 'code' and frame[v].dtype.kind in 'iuf':
+            cols[v] = frame[v].to_numpy().astype(code_dtype(frame[v]))
+        elif kind == 'float64' and frame[v].dtype.kind in 'iuf':
+            cols[v] = frame[v].to_numpy().astype('float64')
+        elif kind == 'category' and frame[v].dtype == object:
+            cols[v] = frame[v].astype('category')
+    return frame.assign(**cols)
+
+def plan_report(frame, plan):
+    # Bytes by storage class, as planned and as int64/float64/object
+    # columns would take them.
+    rows = []
+    for v in frame.columns:
+        col = frame[v]
+        now = int(col.memory_usage(index = False, deep = True))
+        if isinstance(col.dtype, pd.CategoricalDtype) or col.dtype == object:
+            before = int(col.astype(object).memory_usage(index = False,
+                deep = True))
+        else:
+            before = 8 * len(col)
+        rows.append((plan.get(v, 'unplanned'), before, now))
+    report = pd.DataFrame(rows, columns = ['plan', 'before', 'after'])
+    report = report.groupby('plan').sum()
+    report.loc['total'] = report.sum()
+    report['ratio'] = report.before / report.after
+    return report
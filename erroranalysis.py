@@ -0,0 +1,161 @@
+'''
+Error analysis of a classifier's predictions against the neuropathology.
+
+abc_scores gives the NIA-AA ABC scores of Alzheimer's disease
+neuropathologic change: the A score from the Thal phase (NPTHAL) through a
+lookup array, the B score from the Braak stage (NACCBRAA), the C score from
+the CERAD neuritic plaque score (NACCNEUR), and ABC from the three, all as
+whole-column operations.
+
+error_cells counts the visits in each cell of the confusion matrix (true
+class by predicted class) by the value of each neuropathology marker, in one
+grouped pass over the markers stacked end to end. The markers are the ABC
+score, the presence of each pathology (coded from the rules in pathrules.py
+with presence = True), and the vascular findings. Every table of the error
+analysis is a selection of cells from these counts, so error_tables only
+slices them, and write_tables writes them all out, each as .tex and .csv.
+Given the participant of each visit (groups), error_tables also gives the
+confusion matrix and per-class recall, precision and F1, balanced accuracy
+and accuracy with participant-level bootstrap intervals (see bootstrap.py).
+Rerunning the analysis for another classifier's predictions takes one call:
+
+    write_tables(error_tables(Xy, pred = 'WOVR', groups = 'NACCID'))
+
+Classes are numbered from 0 as in the classifier's output: 0 AD, 1 FTLD-tau,
+2 FTLD-TDP, 3 Lewy body disease, 4 vascular disease.
+'''
+
+# Module imports
+import os
+import pandas as pd
+import numpy as np
+from pathrules import compile_rules
+from bootstrap import bootstrap_cis
+
+classrules = compile_rules()
+
+classnames = ['AD', 'Tau', 'TDP', 'LB', 'Vasc']
+
+# Thal phase (NPTHAL codes -4 to 9, by code + 4) to A score; -4 (no
+# neuropathology data), 8 and 9 (not assessed, missing) are unscored.
+thal_a = np.full(14, np.nan)
+thal_a[4:10] = [0, 1, 1, 2, 3, 3]
+
+# Vascular findings: missing-data codes, and NPPVASC's code 2 (present but
+# not primary) counted as absent.
+vascvar = [('NPPVASC', 'Primary vascular'), ('NPINF', 'Old infarcts'),
+    ('NACCMICR', 'Microinfarcts'), ('NACCHEM', 'Hemorrhages'),
+    ('NPPATH', 'Other')]
+vasccodes = [-4, 8, 9]
+
+def lookup(table, x, offset):
+    # table[x + offset], NaN where that is not an index into table.
+    x = np.asarray(x, dtype = 'float64') + offset
+    ok = (x >= 0) & (x < len(table)) & (x == np.floor(x))
+    out = np.full(x.shape, np.nan)
+    out[ok] = table[x[ok].astype('int64')]
+    return out
+
+def abc_scores(frame):
+    # Braak03, Ascore, Bscore, Cscore and ABC for each row of frame.
+    braak = frame.NACCBRAA.to_numpy(dtype = 'float64')
+    neur = frame.NACCNEUR.to_numpy(dtype = 'float64')
+    a = lookup(thal_a, frame.NPTHAL, 4)
+    b = np.ceil(braak / 2)
+    c = np.where(np.isin(neur, [8, 9]), np.nan, neur)
+    # Later rules take precedence; comparisons with NaN are false.
+    abc = np.select([(a == 3) & (b == 3) & (c > 1),
+        (a > 1) & (b > 1),
+        (a == 1) & (b > 1) & (c > 1),
+        (a > 0) & (b < 2),
+        (a == 1) & (c < 2)], [3, 2, 2, 1, 1], 0)
+    return {'Braak03': np.where(b > 3, np.nan, b), 'Ascore': a, 'Bscore': b,
+        'Cscore': c, 'ABC': abc}
+
+def markers(Xy):
+    # Neuropathology markers the error tables count, by name.
+    out = {'ABC': Xy.ABC.to_numpy(dtype = 'float64')}
+    presence = classrules.flag_values(Xy, presence = True)
+    for flag in ['TauPath', 'TDPPath', 'LBPath', 'VPath']:
+        out[flag] = np.asarray(presence[flag], dtype = 'float64')
+    for v, name in vascvar:
+        x = Xy[v].to_numpy(dtype = 'float64')
+        if v == 'NPPVASC':
+            x = np.where(x == 2, 0, x)
+        out[v] = np.where(np.isin(x, vasccodes), np.nan, x)
+    return out
+
+def error_cells(Xy, true = 'Class', pred = 'WOVR'):
+    # Visits by marker, true class, predicted class and marker value
+    # (NaN for missing), in one long table.
+    found = markers(Xy)
+    n = Xy.shape[0]
+    k = len(found)
+    stacked = pd.DataFrame({'marker': np.repeat(np.arange(k), n),
+        'true': np.tile(Xy[true].to_numpy(), k),
+        'pred': np.tile(Xy[pred].to_numpy(), k),
+        'value': np.concatenate(list(found.values()))})
+    cells = stacked.groupby(['marker', 'true', 'pred', 'value'],
+        dropna = False).size().rename('count').reset_index()
+    cells['marker'] = np.array(list(found))[cells.marker]
+    return cells
+
+def cell_table(cells, marker, rows, keep):
+    # Counts of a marker's values (columns) by true or predicted class
+    # (rows = 'true' or 'pred'), over the cells where keep(true, pred).
+    sel = cells.loc[(cells.marker == marker) & keep(cells.true, cells.pred) &
+        cells.value.notna()]
+    return sel.pivot_table(index = rows, columns = 'value', values = 'count',
+        aggfunc = 'sum', fill_value = 0)
+
+def error_tables(Xy, true = 'Class', pred = 'WOVR', groups = None,
+    nboot = 10000):
+    # The error-analysis tables, by name, from one pass of counting; with
+    # groups (the column of participant IDs), the bootstrapped metrics too.
+    cells = error_cells(Xy, true, pred)
+    tables = {'error_cells': cells}
+    first = cells.loc[cells.marker == 'ABC']
+    tables['confusion'] = first.pivot_table(index = 'true', columns = 'pred',
+        values = 'count', aggfunc = 'sum', fill_value = 0)
+    if groups is not None:
+        tables['metrics'], tables['confusion_ci'] = bootstrap_cis(Xy[true],
+            Xy[pred], Xy[groups], classnames, nboot)
+        tables['metrics'] = tables['metrics'].set_index(['metric', 'class'])
+
+    # ABC scores of non-AD cases called AD.
+    adfatab = cell_table(cells, 'ABC', 'true',
+        lambda t, p: (p == 0) & (t != 0))
+    adfatab.index = [classnames[int(c)] for c in adfatab.index]
+    adfatab.columns = pd.Index(adfatab.columns.astype('int64'), name = 'ABC')
+    tables['adfatab'] = adfatab
+
+    # Presence of each pathology in AD cases called non-AD.
+    rows = []
+    for flag, name in zip(['TauPath', 'TDPPath', 'LBPath', 'VPath'],
+        classnames[1:]):
+        t = cell_table(cells, flag, 'true', lambda t, p: (p != 0) & (t == 0))
+        rows.append(t.sum(axis = 0).rename(name))
+    tables['nadfatab'] = yes_no(pd.DataFrame(rows))
+
+    # Vascular findings in cases called vascular that are not.
+    rows = []
+    for v, name in vascvar:
+        t = cell_table(cells, v, 'pred', lambda t, p: (p == 4) & (t != 4))
+        rows.append(t.sum(axis = 0).rename(name))
+    tables['vfatab'] = yes_no(pd.DataFrame(rows))
+    return tables
+
+def yes_no(table):
+    # Columns 0 and 1 as No and Yes.
+    table = table.reindex(columns = [0, 1], fill_value = 0).fillna(0)
+    table.columns = ['No', 'Yes']
+    return table.astype('int64')
+
+def write_tables(tables, out_dir = '.'):
+    # Each table as <name>.tex and <name>.csv (the cell counts as CSV only).
+    os.makedirs(out_dir, exist_ok = True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(out_dir, name + '.csv'),
+            index = name != 'error_cells')
+        if name != 'error_cells':
+            table.to_latex(os.path.join(out_dir, name + '.tex'))
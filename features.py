@@ -0,0 +1,33 @@
+'''
+Assembly of the sparse feature matrix.
+
+The predictor blocks (pass-through, Boolean, numeric, ordinal and one-hot
+nominal variables) are stacked side by side into one CSR matrix, with a
+pandas Index of column names alongside it. Dense blocks go straight from
+their NumPy arrays into the sparse matrix, without intermediate data frames,
+and zeros are never stored. Splits index its rows by row number (see
+splits.py), and stay sparse.
+'''
+
+# Module imports
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+def hstack_blocks(blocks, dtype = 'float64'):
+    # blocks: list of (column names, values), where values is a 2-D array or
+    # a sparse matrix with one column per name.
+    mats = []
+    names = []
+    for cols, values in blocks:
+        cols = list(cols)
+        if values.shape[1] != len(cols):
+            raise ValueError('block has %d columns but %d names' %
+                (values.shape[1], len(cols)))
+        if sparse.issparse(values):
+            mats.append(values.tocsr())
+        else:
+            mats.append(sparse.csr_matrix(np.asarray(values, dtype = dtype)))
+        names += cols
+    X = sparse.hstack(mats, format = 'csr', dtype = dtype)
+    return X, pd.Index(names)
@@ -0,0 +1,182 @@
+'''
+Incremental processing of new NACC data freezes.
+
+A new freeze is mostly the previous one plus new visits and new autopsies.
+Rather than rebuilding everything, update_state compares the new freeze with
+the state saved by the last run, visit by visit (keyed by NACCID and
+VISITDATE, with a hash of each visit's raw values), and codes and transforms
+only the visits that are new or have changed. Their rows are appended to the
+stored feature matrix; rows of visits that changed or left the cohort are
+dropped. Reading the investigator file is still a full pass, but everything
+after it costs time in proportion to the new data.
+
+Variable selection, the one-hot categories and X's columns stay as fitted by
+the last full run of data_prep.py (see preprocess.py). The imputed means and
+medians stay frozen too unless refit is asked for, in which case they are
+recomputed from mergeable summaries (counts and sums for numeric variables,
+value counts for ordinal ones) that are kept up to date with each update,
+and the imputed cells of the stored rows are rewritten to match.
+
+The state directory holds the preprocessor, X (as a .npz), the numeric and
+ordinal values before imputation, the outcome columns and the split (part
+and CV fold; see splits.py) of X's rows, and the keys and hashes of every
+visit in the cohort. New visits join their participant's split, and new
+participants are dealt out to the parts. Usage:
+
+    python freeze.py investigator_nacc49.csv [state directory] [--xvar xvar.csv]
+        [--refit]
+'''
+
+# Module imports
+import os
+import shutil
+import pickle
+import argparse
+import pandas as pd
+import numpy as np
+from scipy import sparse
+import cache
+from cohort import read_cohort, codings, outcomes, visit_keys, visit_digests
+from preprocess import Preprocessor
+from splits import assign_parts
+
+def summaries(V, prep):
+    # Mergeable summaries of the values the imputers are fitted on: per
+    # numeric variable, the count and sum of observed values; per ordinal
+    # variable, the counts of each value.
+    k = len(prep.numvar)
+    num = V[:,:k]
+    obs = ~np.isnan(num)
+    hist = [pd.Series(x[~np.isnan(x)]).value_counts() for x in V[:,k:].T]
+    return {'n': obs.sum(axis = 0), 's': np.where(obs, num, 0).sum(axis = 0),
+        'hist': hist}
+
+def merge_summaries(a, b, sign = 1):
+    # a plus b, or a minus b with sign = -1.
+    hist = [x.add(sign * y, fill_value = 0) for x, y in zip(a['hist'], b['hist'])]
+    return {'n': a['n'] + sign * b['n'], 's': a['s'] + sign * b['s'],
+        'hist': [h.loc[h > 0] for h in hist]}
+
+def hist_median(h):
+    # Median from value counts, averaging the middle two for an even count.
+    if h.sum() == 0:
+        return np.nan
+    h = h.sort_index()
+    c = np.cumsum(h.to_numpy())
+    lo = h.index[np.searchsorted(c, (c[-1] - 1) // 2 + 1)]
+    hi = h.index[np.searchsorted(c, c[-1] // 2 + 1)]
+    return (lo + hi) / 2
+
+def refit_statistics(prep, summ):
+    # Means and medians from the summaries; variables with no observations
+    # left keep their old value.
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        means = summ['s'] / summ['n']
+    medians = np.array([hist_median(h) for h in summ['hist']])
+    prep.means = np.where(np.isnan(means), prep.means, means)
+    prep.medians = np.where(np.isnan(medians), prep.medians, medians)
+
+def xvar_key(xvar_path):
+    with open(xvar_path, 'rb') as f:
+        return cache.cache_key(f.read())
+
+def save_state(state_dir, seen, rows, X, V, prep, xvar_path = 'xvar.csv',
+    summ = None, coding = 'corrected'):
+    # seen: visit_digests of the whole cohort as read; rows: keys, outcomes
+    # and split (part and fold) for the rows of X; V: the numeric and ordinal columns of X
+    # before imputation; coding: the class coding of the outcomes (see
+    # pathrules.py), which updates keep to.
+    if summ is None:
+        summ = summaries(V, prep)
+    tmp = state_dir + '.tmp'
+    shutil.rmtree(tmp, ignore_errors = True)
+    os.makedirs(tmp)
+    prep.save(os.path.join(tmp, 'preprocessor.pkl'))
+    sparse.save_npz(os.path.join(tmp, 'X.npz'), X.tocsr(), compressed = False)
+    np.save(os.path.join(tmp, 'V.npy'), V)
+    cache.save_frame(rows.reset_index(drop = True), os.path.join(tmp, 'rows'))
+    cache.save_frame(seen, os.path.join(tmp, 'seen'))
+    with open(os.path.join(tmp, 'state.pkl'), 'wb') as f:
+        pickle.dump({'xvar': xvar_key(xvar_path), 'summaries': summ,
+            'coding': coding}, f)
+    shutil.rmtree(state_dir, ignore_errors = True)
+    os.replace(tmp, state_dir)
+
+def load_state(state_dir):
+    with open(os.path.join(state_dir, 'state.pkl'), 'rb') as f:
+        state = pickle.load(f)
+    state['prep'] = Preprocessor.load(os.path.join(state_dir, 'preprocessor.pkl'))
+    state['X'] = sparse.load_npz(os.path.join(state_dir, 'X.npz')).tocsr()
+    state['V'] = np.load(os.path.join(state_dir, 'V.npy'))
+    state['rows'] = cache.load_frame(os.path.join(state_dir, 'rows'))
+    state['seen'] = cache.load_frame(os.path.join(state_dir, 'seen'))
+    return state
+
+def update_state(path, state_dir = 'freeze', xvar_path = 'xvar.csv',
+    refit = False):
+    # Bring the state in state_dir up to the freeze in path. Returns the
+    # numbers of new, changed and removed visits.
+    state = load_state(state_dir)
+    if state['xvar'] != xvar_key(xvar_path):
+        raise ValueError('%s has changed since the last full run; rerun '
+            'data_prep.py' % xvar_path)
+    prep = state['prep']
+    raw = read_cohort(path, pd.read_csv(xvar_path))
+    seen = visit_digests(raw)
+    keys = pd.MultiIndex.from_frame(seen[['NACCID', 'VISITDATE']])
+    old = state['seen']
+    at = pd.MultiIndex.from_frame(old[['NACCID', 'VISITDATE']]).get_indexer(keys)
+    olddigest = old.digest.to_numpy()[np.maximum(at, 0)]
+    new = at < 0
+    changed = ~new & (olddigest != seen.digest.to_numpy())
+    touched = new | changed
+    removed = len(old) - (~new).sum()
+
+    # Stored rows of visits that changed or are no longer in the cohort.
+    rows = state['rows']
+    rowkeys = visit_keys(rows)
+    stale = rowkeys.isin(keys[touched]) | ~rowkeys.isin(keys)
+
+    # Code and transform the new and changed visits.
+    sub = codings[state['coding']].apply(raw.loc[touched])
+    sub = sub.loc[sub.Class != 0]
+    A = prep.masked_arrays(prep.batch_arrays(sub))
+    Vnew = A[:,prep.imputes]
+    summ = merge_summaries(state['summaries'],
+        summaries(state['V'][stale], prep), sign = -1)
+    summ = merge_summaries(summ, summaries(Vnew, prep))
+
+    X = state['X'][~stale]
+    V = np.vstack([state['V'][~stale], Vnew])
+    if refit:
+        refit_statistics(prep, summ)
+        # Rewrite the imputed block of the rows kept from before, as
+        # prep.imputed makes it (standardized too, if the preprocessor is).
+        block = prep.filled(V[:X.shape[0]])
+        X = sparse.hstack([X[:,:prep.imputes.start], sparse.csr_matrix(block),
+            X[:,prep.imputes.stop:]], format = 'csr')
+    X = sparse.vstack([X, sparse.csr_matrix(prep.imputed(A))], format = 'csr')
+    subrows = visit_keys(sub).to_frame(index = False)
+    for v in outcomes:
+        subrows[v] = sub[v].to_numpy()
+    if 'part' in rows.columns:
+        subrows['part'], subrows['fold'] = assign_parts(sub,
+            rows[['NACCID', 'part', 'fold']])
+    rows = pd.concat([rows.loc[~stale], subrows], ignore_index = True)
+    save_state(state_dir, seen, rows, X, V, prep, xvar_path, summ,
+        state['coding'])
+    return {'new': int(new.sum()), 'changed': int(changed.sum()),
+        'removed': int(removed)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('investigator')
+    parser.add_argument('state_dir', nargs = '?', default = 'freeze')
+    parser.add_argument('--xvar', default = 'xvar.csv',
+        help = 'the xvar.csv the state was made with')
+    parser.add_argument('--refit', action = 'store_true')
+    args = parser.parse_args()
+    counts = update_state(args.investigator, args.state_dir, args.xvar,
+        args.refit)
+    print('%(new)d new, %(changed)d changed and %(removed)d removed visits' %
+        counts)
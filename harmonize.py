@@ -0,0 +1,125 @@
+'''
+Resolution of redundant variables, mostly UDS version 2 & 3 form changes.
+
+The rules are a table, harmonize.csv next to xvar.csv, one row per value
+remap:
+
+    Target,Source,When,From,To,Comments
+    CVPACE,CVPACDEF,(-4),(0),0,CVPACE (UDS 3) is not asked where ...
+    ABRUPT,ABRUPT,,(2),1,Two-level coding collapsed
+    English,PRIMLANG,,*,0,
+
+Target is set to To where Source has one of the From codes (* for any
+other value, missing included), on the rows where Target has one of the
+When codes (all rows if When is blank). Codes are written as in the
+NaNValues column of xvar.csv. A target with no When codes that is not its
+own source is a new variable, derived from its source alone; a source that
+is not its own target is folded into the target and no longer needed as a
+predictor (its Keep flag in xvar.csv is cleared by data_prep.py).
+
+Harmonizer compiles the table once into a sorted lookup array of From codes
+and To values for each target and source, so each target is rewritten in a
+single np.where over its column. It works on whole columns, and takes
+either a data frame or a dict of arrays (such as a single visit being
+scored), so the same rules serve data preparation and the fitted
+preprocessor, which keeps the Harmonizer it was fitted with. Columns keep
+their dtype wherever the replacement values allow it. Adding a UDS v2 to v3
+rename is a row or two in harmonize.csv.
+'''
+
+# Module imports
+import os
+import pandas as pd
+import numpy as np
+from nancodes import parse_codes
+
+here = os.path.dirname(os.path.abspath(__file__))
+default_path = os.path.join(here, 'harmonize.csv')
+
+def column(cols, v):
+    return np.asarray(cols[v])
+
+def positions(keys, x):
+    # Index in keys (sorted) of each value of x, len(keys) where not found.
+    # A few codes are matched one comparison each, in x's dtype where the
+    # codes allow it, which is faster than a search.
+    if len(keys) > 8:
+        at = np.minimum(np.searchsorted(keys, x), len(keys) - 1)
+        return np.where(keys[at] == x, at, len(keys))
+    at = np.full(len(x), len(keys), dtype = 'int8')
+    for j, k in enumerate(narrowed(keys, x.dtype)):
+        at -= (x == k).view('int8') * np.int8(len(keys) - j)
+    return at
+
+def narrowed(values, dtype):
+    # values as dtype where that loses nothing.
+    cast = values.astype(dtype)
+    return cast if np.array_equal(cast, values) else values
+
+class Harmonizer:
+    def __init__(self, spec):
+        # spec: the table of harmonize.csv.
+        self.rules = {}
+        for (target, source, when), rows in spec.groupby(['Target', 'Source',
+            spec.When.fillna('')], sort = False):
+            keys, values, default = [], [], np.nan
+            for codes, to in zip(rows.From, rows.To):
+                if str(codes).strip() == '*':
+                    default = float(to)
+                    continue
+                for c in parse_codes(codes):
+                    keys.append(float(c))
+                    values.append(float(to))
+            order = np.argsort(keys, kind = 'stable')
+            keys, values = np.array(keys)[order], np.array(values)[order]
+            if len(np.unique(keys)) < len(keys):
+                raise ValueError('%s has more than one value for a code of %s'
+                    % (target, source))
+            self.rules.setdefault(target, []).append((source,
+                np.array(parse_codes(when), dtype = 'float64'), keys, values,
+                default))
+        # Targets made from their sources alone, variables read, and sources
+        # folded into another variable.
+        self.added = [t for t, rules in self.rules.items() if not
+            any(len(when) or source == t for source, when, k, v, d in rules)]
+        self.inputs = list(dict.fromkeys([t for t in self.rules if t not in
+            self.added] + [r[0] for rules in self.rules.values() for r in rules]))
+        self.replaced = list(dict.fromkeys(r[0] for t, rules in
+            self.rules.items() for r in rules if r[0] != t))
+
+    def __call__(self, cols):
+        # Harmonized and derived columns, keyed by name.
+        out = {}
+        for target, rules in self.rules.items():
+            if target in self.added:
+                n = len(column(cols, rules[0][0]))
+                x = None
+            else:
+                x = column(cols, target)
+                n = len(x)
+            for source, when, keys, values, default in rules:
+                at = positions(keys, column(cols, source))
+                # Codes found, or else the default (the last entry); only the
+                # codes found change if there is no default.
+                table = np.append(values, default)
+                if np.isnan(default):
+                    table[-1] = 0
+                    change = at < len(keys)
+                else:
+                    change = np.ones(n, dtype = bool)
+                new = narrowed(table, 'int64' if x is None else x.dtype)[at]
+                if len(when):
+                    change &= positions(when, x) < len(when)
+                if x is None:
+                    x = np.full(n, np.nan)
+                x = new if change.all() else np.where(change, new, x)
+            out[target] = x
+        return out
+
+def read_spec(path = default_path):
+    return Harmonizer(pd.read_csv(path, dtype = {'When': str, 'From': str}))
+
+def spec_path(xvar_path):
+    # The harmonize.csv next to an xvar.csv.
+    return os.path.join(os.path.dirname(os.path.abspath(xvar_path)),
+        'harmonize.csv')
@@ -0,0 +1,157 @@
+'''
+Lightweight instrumentation of pipeline steps.
+
+Set the environment variable NACC_TRACE to a file name to record, for each
+step, its wall time, CPU time (of the whole process and of the thread running
+the step), peak RSS above the RSS at the start of the step, and the rows and
+columns of its inputs and outputs. A name ending in .json gives a Chrome
+trace (open it in chrome://tracing or Perfetto); any other name gives JSON
+lines, one object per step. Events are written as each step finishes, so a
+run that dies part way still leaves its trace up to that point.
+
+Steps are marked with
+
+    with step('class coding', aut) as s:
+        aut = code_classes(aut)
+        s.output(aut)
+
+When NACC_TRACE is not set, step hands back one shared do-nothing object and
+nothing is measured or written.
+
+Peak RSS is read from /proc/self/status after resetting the kernel's
+high-water mark at the start of each step (Linux); elsewhere it falls back to
+the process peak from getrusage, which cannot be reset. The high-water mark
+is folded into every open step before each reset, so nested steps do not
+hide the peak of the step around them. Steps that run at the same time
+(stages on different threads) share the process's RSS, so their peaks
+overlap.
+'''
+
+# Module imports
+import os
+import sys
+import json
+import time
+import threading
+import resource
+
+target = os.environ.get('NACC_TRACE') or None
+
+class NullStep:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def output(self, *values):
+        pass
+
+nullstep = NullStep()
+
+def shape(value):
+    # [rows, columns] of a frame, array or sparse matrix; [rows] for a
+    # series or 1-D array; None for anything else.
+    s = getattr(value, 'shape', None)
+    if s is None:
+        return None
+    return [int(x) for x in s[:2]]
+
+def memory():
+    # Current and peak RSS in bytes.
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return (int(fields['VmRSS'].split()[0]) * 1024,
+            int(fields['VmHWM'].split()[0]) * 1024)
+    except (OSError, KeyError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == 'darwin' else 1024
+        return peak, peak
+
+def reset_peak(steps):
+    # Reset the RSS high-water mark to the current RSS (Linux 4.0 and up),
+    # after passing it on to the steps still running.
+    peak = memory()[1]
+    for st in steps:
+        st.peak = max(st.peak, peak)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.chrome = path.endswith('.json')
+        self.lock = threading.Lock()
+        self.running = set()
+        self.origin = time.perf_counter()
+        with open(path, 'w') as f:
+            if self.chrome:
+                # Chrome's trace format allows the array to be left open.
+                f.write('[\n')
+
+    def write(self, event):
+        if self.chrome:
+            args = {k: v for k, v in event.items() if k not in
+                ('name', 'start', 'wall_s', 'pid', 'thread')}
+            event = {'name': event['name'], 'ph': 'X', 'pid': event['pid'],
+                'tid': event['thread'], 'ts': event['start'] * 1e6,
+                'dur': event['wall_s'] * 1e6, 'args': args}
+            line = json.dumps(event) + ',\n'
+        else:
+            line = json.dumps(event) + '\n'
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+recorder = Recorder(target) if target else None
+
+class Step:
+    def __init__(self, name, inputs):
+        self.name = name
+        self.inputs = [shape(x) for x in inputs]
+        self.outputs = []
+
+    def output(self, *values):
+        self.outputs = [shape(x) for x in values]
+
+    def __enter__(self):
+        self.peak = 0
+        with recorder.lock:
+            reset_peak(recorder.running)
+            recorder.running.add(self)
+        self.rss = memory()[0]
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.thread_cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        thread_cpu = time.thread_time() - self.thread_cpu
+        with recorder.lock:
+            recorder.running.discard(self)
+            rss, peak = memory()
+        peak = max(peak, self.peak)
+        recorder.write({'name': self.name,
+            'start': self.wall - recorder.origin,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'thread_cpu_s': thread_cpu,
+            'rss_MB': rss / 2**20,
+            'peak_rss_delta_MB': max(peak - self.rss, 0) / 2**20,
+            'inputs': self.inputs,
+            'outputs': self.outputs,
+            'failed': exc[0] is not None,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name})
+        return False
+
+def step(name, *inputs):
+    if recorder is None:
+        return nullstep
+    return Step(name, inputs)
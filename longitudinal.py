@@ -0,0 +1,97 @@
+'''
+Change variables from longitudinal data.
+
+Participants have one or more visits. For each visit, change_columns gives
+its index among the participant's visits (VISITIDX, 0 at baseline), the years
+since the baseline visit (BASEYRS) and, for each variable in changevar,
+
+    <v>_DIFF     change since the participant's last visit at which v was
+                 observed;
+    <v>_SLOPE    change per year since the first visit at which v was
+                 observed.
+
+Values must already have their missing-data codes set to NaN (see
+nancodes.py). A visit at which v is missing has NaN for both. A visit at
+which v is observed for the first time has no earlier value to compare with:
+with first = 'zero' (the default) its change is 0, i.e. no change observed
+yet; with first = 'nan' it is left missing.
+
+Visits are sorted once by participant and visit date (or not at all if they
+are in that order already, as in the NACC files), and everything is done with
+whole-column NumPy operations on the sorted arrays: participants are runs of
+rows, and the last and first earlier observations of each variable are found
+with running maxima and minima of row numbers. There are no loops over
+participants, so the cost grows with the number of visits.
+'''
+
+# Module imports
+import pandas as pd
+import numpy as np
+from dtypes import code_dtype
+
+# Numeric and Ordinal variables whose change over visits is of interest.
+changevar = ['CDRSUM', 'NACCMMSE', 'NACCGDS', 'LOGIMEM', 'MEMUNITS',
+    'ANIMALS', 'TRAILA', 'TRAILB', 'COMPORT', 'BPSYS', 'BPDIAS', 'NACCBMI']
+
+def visit_order(sub, t):
+    # Row order by participant, then time; None if the rows are in order.
+    if np.all((np.diff(sub) > 0) | ((np.diff(sub) == 0) & ~(np.diff(t) < 0))) \
+        and not np.isnan(t).any():
+        return None
+    return np.lexsort((t, sub))
+
+def change_columns(frame, variables = changevar, first = 'zero'):
+    # Change variables for each row of frame (which needs NACCID and
+    # VISITDATE), row for row with it.
+    if first not in ('zero', 'nan'):
+        raise ValueError("first must be 'zero' or 'nan', not %r" % (first,))
+    variables = [v for v in variables if v in frame.columns]
+    sub = pd.factorize(frame.NACCID)[0]
+    t = frame.VISITDATE.to_numpy(dtype = 'datetime64[ns]')
+    t = np.where(np.isnat(t), np.nan, t.astype('int64') / (365.25 * 86400e9))
+    order = visit_order(sub, t)
+    if order is not None:
+        sub, t = sub[order], t[order]
+
+    # Participants are runs of rows; start is each row's participant's first
+    # row.
+    n = len(sub)
+    row = np.arange(n)
+    new = np.ones(n, dtype = bool)
+    new[1:] = sub[1:] != sub[:-1]
+    start = np.maximum.accumulate(np.where(new, row, 0))
+    cols = {'VISITIDX': row - start, 'BASEYRS': t - t[start]}
+
+    fill = 0.0 if first == 'zero' else np.nan
+    for v in variables:
+        x = frame[v].to_numpy(dtype = 'float64')
+        x = x if order is None else x[order]
+        seen = ~np.isnan(x)
+        # Last row up to and including this one where v was observed, and
+        # the participant's first such row.
+        last = np.maximum.accumulate(np.where(seen, row, -1))
+        prev = np.concatenate([[-1], last[:-1]])
+        firstseen = np.where(seen, row, n)
+        ends = np.flatnonzero(new)
+        firstseen = np.minimum.reduceat(firstseen, ends)[np.cumsum(new) - 1]
+        earlier = seen & (prev >= start)
+        diff = np.full(n, np.nan)
+        diff[seen] = fill
+        diff[earlier] = x[earlier] - x[prev[earlier]]
+        slope = np.full(n, np.nan)
+        slope[seen] = fill
+        base = firstseen[earlier]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            slope[earlier] = np.where(t[earlier] > t[base],
+                (x[earlier] - x[base]) / (t[earlier] - t[base]), np.nan)
+        cols[v + '_DIFF'] = diff
+        cols[v + '_SLOPE'] = slope
+
+    changes = pd.DataFrame(cols)
+    if order is not None:
+        changes.index = order
+        changes = changes.sort_index()
+    changes = changes.astype('float32').astype({'VISITIDX':
+        code_dtype(changes.VISITIDX)})
+    changes.index = frame.index
+    return changes
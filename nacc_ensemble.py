@@ -0,0 +1,111 @@
+'''
+Command line for the steps of the analysis, each runnable as its own job:
+
+    python nacc_ensemble.py ingest    read the cohort, code and mask it
+    python nacc_ensemble.py split     participant splits and CV folds
+    python nacc_ensemble.py prep      screening, imputation, encoding; writes
+                                      preprocessor.pkl, splits.npz and freeze/
+                                      to the --out directory
+    python nacc_ensemble.py score     score a feature matrix with the
+                                      classifier (see scoring.py)
+    python nacc_ensemble.py analyze   error analysis of the study's
+                                      classifier; writes its tables
+
+ingest, split, prep and analyze run the stages of data_prep.py named in
+commands, through its pipeline restricted to those stages and what they
+depend on. Stage outputs are memoized in the cache directory, so a step
+whose inputs a previous step has made loads them rather than redoing them
+(and does redo them if they are missing or out of date).
+
+This module imports only the standard library; each command imports the
+modules it needs when it runs, so --help answers at once, and scikit-learn
+is only imported by the stages that fit models or load the classifier.
+'''
+
+# Module imports
+import os
+import sys
+import argparse
+
+# Stages of data_prep.py run by each command.
+commands = {'ingest': ['cohort', 'dated', 'drugs', 'coded', 'masked',
+        'longitudinal'],
+    'split': ['split', 'study_split'],
+    'prep': ['screened', 'vartypes', 'impute_mean', 'impute_median',
+        'impute_bool', 'encode', 'features', 'preprocessor', 'saved'],
+    'analyze': ['errors', 'tables']}
+
+def run_stages(args):
+    import data_prep
+    from harmonize import spec_path
+    pipeline = data_prep.pipeline.upstream(commands[args.command])
+    pipeline.cache_dir = args.cache
+    paths = {'investigator': args.investigator, 'xvar_path': args.xvar,
+        'harmonize_path': args.harmonize or spec_path(args.xvar),
+        'coding': args.coding, 'cache_dir': args.cache,
+        'classifier': args.classifier, 'selected': args.selected,
+        'out_dir': args.out}
+    pipeline.run(commands[args.command], **{v: paths[v] for v in
+        pipeline.given()})
+    if args.memory:
+        print(pipeline.memory_report().to_string(index = False))
+
+def score(args):
+    from preprocess import Preprocessor
+    from scoring import load_matrix, selected_columns, load_classifier, \
+        score_matrix
+    X = load_matrix(args.X)
+    cols = selected_columns(Preprocessor.load(args.preprocessor).columns,
+        args.selected)
+    pred, prob = score_matrix(load_classifier(args.classifier), X, cols,
+        args.out_dir, args.chunksize, args.nproc, args.proba)
+    print('%d visits scored; predictions in %s' % (len(pred),
+        os.path.join(args.out_dir, 'pred.npy')))
+
+def parser():
+    top = argparse.ArgumentParser(prog = 'nacc-ensemble', description =
+        'Steps of the NACC neuropathology classification analysis.')
+    sub = top.add_subparsers(dest = 'command', required = True)
+    helps = {'ingest': 'read the cohort, code and mask it',
+        'split': 'participant splits and CV folds',
+        'prep': 'screening, imputation and encoding of the features',
+        'analyze': "error analysis of the study's classifier"}
+    for name in commands:
+        p = sub.add_parser(name, help = helps[name])
+        p.add_argument('--cache', default = 'cache',
+            help = 'stage cache directory')
+        p.add_argument('--investigator', default = 'investigator_nacc48.csv')
+        p.add_argument('--xvar', default = 'xvar.csv')
+        p.add_argument('--harmonize', help = 'harmonization rules '
+            '(default: harmonize.csv next to xvar.csv)')
+        p.add_argument('--coding', choices = ['corrected', 'legacy'],
+            default = 'corrected', help = 'class coding (see pathrules.py); '
+            "legacy reproduces the study's, which analyze needs for the "
+            "study's classifier")
+        p.add_argument('--classifier',
+            default = 'weovr_classifier_og_data.pickle')
+        p.add_argument('--selected', default = 'selected_features.csv')
+        p.add_argument('--out', default = '.', help = 'directory for '
+            'preprocessor.pkl, splits.npz and the freeze state')
+        p.add_argument('--memory', action = 'store_true',
+            help = 'list the bytes held by each stage output')
+        p.set_defaults(func = run_stages)
+    p = sub.add_parser('score', help = 'score a feature matrix')
+    p.add_argument('X', nargs = '?', default = os.path.join('freeze', 'X.npz'),
+        help = '.npy feature matrix or .npz sparse matrix')
+    p.add_argument('out_dir', nargs = '?', default = 'scores')
+    p.add_argument('--preprocessor', default = 'preprocessor.pkl')
+    p.add_argument('--classifier', default = 'weovr_classifier_og_data.pickle')
+    p.add_argument('--selected', default = 'selected_features.csv')
+    p.add_argument('--chunksize', type = int, default = 10000)
+    p.add_argument('--nproc', type = int)
+    p.add_argument('--proba', action = 'store_true')
+    p.set_defaults(func = score)
+    return top
+
+def main(argv = None):
+    args = parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
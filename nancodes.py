@@ -0,0 +1,85 @@
+'''
+Missing-data codes from xvar.csv, parsed once and applied block by block.
+
+The NaNValues column of xvar.csv lists, for each variable, the codes that
+stand for missing data, e.g. (9,-4) or (-4,95,96,97,98). These are read as
+literals (never evaluated as code), and variables sharing the same set of
+codes are masked together in one operation on a 2-D block.
+
+Some variables also get a dummy variable (<variable>_couldnt) flagging that
+the participant could not complete the test. These are listed in the Comments
+column of xvar.csv as "Dummy coding for (95,96,97,98)" and the like, and are
+produced from the same block, just before its codes are masked.
+'''
+
+# Module imports
+import ast
+import re
+import numpy as np
+
+def parse_codes(text):
+    # A NaNValues entry as a tuple of numbers; empty entries give ().
+    if not isinstance(text, str) or text.strip() == '':
+        return ()
+    try:
+        codes = ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError):
+        raise ValueError("cannot read missing-data codes '%s'" % text)
+    if not isinstance(codes, tuple):
+        codes = (codes,)
+    for c in codes:
+        if isinstance(c, bool) or not isinstance(c, (int, float)):
+            raise ValueError("missing-data codes must be numbers: '%s'" % text)
+    return tuple(sorted(set(codes)))
+
+def nan_groups(xvar):
+    # Variables grouped by their set of missing-data codes, in xvar.csv order.
+    groups = {}
+    for v, text in zip(xvar.Variable, xvar.NaNValues):
+        codes = parse_codes(text)
+        if codes:
+            groups.setdefault(codes, []).append(v)
+    return groups
+
+def dummy_groups(xvar):
+    # Variables that get a _couldnt dummy, grouped by the codes it flags.
+    groups = {}
+    pattern = re.compile(r'^Dummy coding for (\(.*\))$')
+    for v, comment in zip(xvar.Variable, xvar.Comments):
+        m = pattern.match(comment) if isinstance(comment, str) else None
+        if m:
+            groups.setdefault(parse_codes(m.group(1)), []).append(v)
+    return groups
+
+def mask_codes(aut, xvar):
+    # Replace missing-data codes with NaN for the variables in xvar that are
+    # in aut, and add the _couldnt dummies (uint8). Only columns that actually
+    # contain a code are rewritten, and become float32 unless they were
+    # float64 or int64 to begin with (see dtypes.py).
+    numeric = set(aut.columns[[dt.kind in 'iufb' for dt in aut.dtypes]])
+    dummyfor = {}
+    for codes, vv in dummy_groups(xvar).items():
+        for v in vv:
+            dummyfor[v] = codes
+    dummies = {}
+    masked = {}
+    for codes, vv in nan_groups(xvar).items():
+        vv = [v for v in vv if v in numeric]
+        if not vv:
+            continue
+        block = aut[vv].to_numpy(dtype = 'float64')
+        for j, v in enumerate(vv):
+            if v in dummyfor:
+                dummies[v] = np.isin(block[:,j], dummyfor[v]).astype('uint8')
+        hit = np.isin(block, codes)
+        block[hit] = np.nan
+        for j in np.flatnonzero(hit.any(axis = 0)):
+            masked[vv[j]] = block[:,j].astype(np.result_type(aut[vv[j]].dtype,
+                'float32'))
+    # Dummies for variables without missing-data codes of their own.
+    for v, codes in dummyfor.items():
+        if v in numeric and v not in dummies:
+            dummies[v] = aut[v].isin(codes).to_numpy().astype('uint8')
+    aut = aut.assign(**masked)
+    order = [v for vv in dummy_groups(xvar).values() for v in vv if v in dummies]
+    return aut.assign(**{v + '_couldnt': dummies[v] for v in order})
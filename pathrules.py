@@ -0,0 +1,294 @@
+'''
+Declarative coding of pathology class outcomes.
+
+Each pathology flag (ADPath, TauPath, LBPath, TDPPath, VPath) is defined by a
+list of rules in classrules below. A rule sets the flag to 1 or overrides it
+to 0 when its condition holds; overrides always win over sets for the same
+flag. Flags are coded in the order they first appear in the table, so a rule
+may refer to a flag defined above it. Class is then taken from the flags in
+the order given by classorder, with later classes taking precedence.
+
+Conditions are written as pandas-style comparisons on variable names, e.g.
+'NPADNC in (2,3)' or '(ADPath == 1) & (NPPLEWY != 1)'. compile_rules parses
+them once, checks them, and turns the whole table into a few NumPy mask
+operations. In particular it rejects conditions like 'ADPath == 1 &
+(NPPLEWY != 1)', which Python reads as 'ADPath == (1 & (NPPLEWY != 1))'.
+
+The original script had seven such conditions (the '& (NPPLEWY != 1)' and
+'& (NPPVASC != 1)' overrides of LBPath and VPath). In classrules, the
+default, they mean what they say, so fewer primary Lewy body and vascular
+cases are cleared, and more visits have a nonzero Class than in the original
+study. That cohort is therefore not the one the study's classifier was
+fitted and evaluated on, and its saved predictions (OG_pred in
+weovr_classifier_og_data.pickle) do not line up with it (data_prep.py's
+errors stage refuses them); they have to be regenerated by refitting.
+
+legacyrules keeps the original coding, with the seven conditions as Python
+read them, to reproduce the published error analysis with the saved
+classifier. rulesets names both; the coding is chosen by name ('corrected'
+or 'legacy') when the cohort is loaded (see cohort.py).
+
+The compiled rules can be applied to any frame that has the variables they
+use, such as the subsets used for error analysis. With presence = True only
+the overrides listed in presencerules apply, so each flag records the
+presence of that pathology regardless of which one is primary (or whether
+it is only contributing), as the original error analysis coded it.
+'''
+
+# Module imports
+import re
+import ast
+import numpy as np
+
+classrules = [
+    # Code Alzheimer's disease pathology based on NPADNC, which implements
+    # ABC scoring based on Montine et al. (2012).
+    ('ADPath', 1, 'NPADNC in (2,3)'),
+    ('ADPath', 1, 'NPPAD == 1'),
+    # Make ADPath false if the AD path diagnosis is as contributing, not as
+    # primary, or another pathology is primary.
+    ('ADPath', 0, 'NPPAD == 2'),
+    ('ADPath', 0, 'NPCAD == 1'),
+    ('ADPath', 0, 'NPPVASC == 1'),
+    ('ADPath', 0, 'NPPLEWY == 1'),
+    ('ADPath', 0, 'NPPFTLD == 1'),
+
+    # Several variables pertain to FTLD tauopathies.
+    ('TauPath', 1, 'NPFTDTAU == 1'),
+    ('TauPath', 1, 'NACCPICK == 1'),
+    ('TauPath', 1, 'NACCCBD == 1'),
+    ('TauPath', 1, 'NACCPROG == 1'),
+    ('TauPath', 1, 'NPFTDT2 == 1'),
+    ('TauPath', 1, 'NPFTDT5 == 1'),
+    ('TauPath', 1, 'NPFTDT6 == 1'),
+    ('TauPath', 1, 'NPFTDT7 == 1'),
+    ('TauPath', 1, 'NPFTDT9 == 1'),
+    ('TauPath', 1, 'NPFRONT == 1'),
+    ('TauPath', 1, 'NPTAU == 1'),
+    ('TauPath', 0, 'ADPath == 1'),
+    ('TauPath', 0, 'NPCFTLD == 1'),
+
+    # Code Lewy body disease based on NPLBOD variable. Do not include
+    # amygdala-predominant, brainstem-predominant, or olfactory-only cases.
+    # See Toledo et al. (2016, Acta Neuropathol) and Irwin et al. (2018, Nat
+    # Rev Neuro).
+    ('LBPath', 1, 'NPLBOD in (2,3)'),
+    ('LBPath', 1, 'NPPLEWY == 1'),
+    ('LBPath', 0, 'NPPLEWY == 2'),
+    ('LBPath', 0, 'NPCLEWY == 1'),
+    ('LBPath', 0, '(ADPath == 1) & (NPPLEWY != 1)'),
+    ('LBPath', 0, '(TauPath == 1) & (NPPLEWY != 1)'),
+
+    # Code TDP-43 pathology based on NPFTDTDP and NPALSMND, excluding FUS and
+    # SOD1 cases.
+    ('TDPPath', 1, 'NPFTD == 1'),
+    ('TDPPath', 1, 'NPFTDTDP == 1'),
+    ('TDPPath', 1, 'NPALSMND == 1'),
+    ('TDPPath', 0, 'ADPath == 1'),
+    ('TDPPath', 0, 'LBPath == 1'),
+    ('TDPPath', 0, 'TauPath == 1'),
+
+    # Code vascular disease based on relevant derived variables.
+    ('VPath', 1, 'NPINF == 1'),
+    ('VPath', 1, 'NACCMICR == 1'),
+    ('VPath', 1, 'NACCHEM == 1'),
+    ('VPath', 1, 'NPPATH == 1'),
+    ('VPath', 1, 'NPPVASC == 1'),
+    ('VPath', 0, 'NPPVASC == 2'),
+    ('VPath', 0, 'NPCVASC == 1'),
+    ('VPath', 0, '(ADPath == 1) & (NPPVASC != 1)'),
+    ('VPath', 0, '(LBPath == 1) & (NPPVASC != 1)'),
+    ('VPath', 0, '(NPPFTLD == 1) & (NPPVASC != 1)'),
+    ('VPath', 0, '(TDPPath == 1) & (NPPVASC != 1)'),
+    ('VPath', 0, '(TauPath == 1) & (NPPVASC != 1)')]
+
+def misread(text):
+    # An override '(A == 1) & (B != 1)' as the original script wrote it,
+    # 'A == 1 & (B != 1)', and so as Python read it: A == (1 & (B != 1)),
+    # that is A equal to 1 where B is not 1, or to 0 where B is 1.
+    m = re.fullmatch(r'\((\w+) == 1\) & \((\w+) != 1\)', text)
+    if m is None:
+        return text
+    a, b = m.groups()
+    return '((%s == 1) & (%s != 1)) | ((%s == 0) & (%s == 1))' % (a, b, a, b)
+
+# The rules as the original study coded them.
+legacyrules = [(flag, value, misread(text)) for flag, value, text in classrules]
+
+rulesets = {'corrected': classrules, 'legacy': legacyrules}
+
+# Overrides that also apply when coding presence rather than primacy: a Lewy
+# body diagnosis recorded as not present.
+presencerules = [('LBPath', 'NPPLEWY == 2')]
+
+# Class codes, lowest precedence first: a case with both TauPath and VPath
+# is coded as vascular. Cases with none of these are Class 0.
+classorder = [('ADPath', 1),
+    ('TauPath', 2),
+    ('TDPPath', 3),
+    ('LBPath', 4),
+    ('VPath', 5)]
+
+class RuleError(ValueError):
+    pass
+
+comparisons = {ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal}
+
+def parse_term(node, text):
+    # A single comparison between a variable and a literal, returned as a
+    # hashable (variable, operator, value) key.
+    if len(node.ops) != 1:
+        raise RuleError("chained comparison in '%s'" % text)
+    left, op, right = node.left, node.ops[0], node.comparators[0]
+    if isinstance(left, (ast.BinOp, ast.BoolOp)) or \
+        isinstance(right, (ast.BinOp, ast.BoolOp)):
+        raise RuleError("operator precedence in '%s': & and | bind more "
+            "tightly than comparisons, so each comparison must be in "
+            "parentheses" % text)
+    if not isinstance(left, ast.Name):
+        raise RuleError("left side of a comparison must be a variable in "
+            "'%s'" % text)
+    try:
+        value = ast.literal_eval(right)
+    except ValueError:
+        raise RuleError("right side of a comparison must be a literal in "
+            "'%s'" % text)
+    if isinstance(op, (ast.In, ast.NotIn)):
+        if not isinstance(value, (tuple, list, set)):
+            value = (value,)
+        return (left.id, type(op).__name__, tuple(sorted(value)))
+    if type(op) not in comparisons:
+        raise RuleError("unsupported comparison in '%s'" % text)
+    if not isinstance(value, (int, float)):
+        raise RuleError("comparison with a non-number in '%s'" % text)
+    return (left.id, type(op).__name__, value)
+
+def compare(x, op, value):
+    if op == 'In':
+        return np.isin(x, value)
+    if op == 'NotIn':
+        return ~np.isin(x, value)
+    return comparisons[getattr(ast, op)](x, value)
+
+def parse_condition(node, text):
+    # Conditions become nested tuples: ('and', a, b), ('or', a, b),
+    # ('not', a), or ('term', key).
+    if isinstance(node, ast.Compare):
+        return ('term', parse_term(node, text))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        return ('and', parse_condition(node.left, text),
+            parse_condition(node.right, text))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        return ('or', parse_condition(node.left, text),
+            parse_condition(node.right, text))
+    if isinstance(node, ast.BoolOp):
+        kind = 'and' if isinstance(node.op, ast.And) else 'or'
+        out = parse_condition(node.values[0], text)
+        for v in node.values[1:]:
+            out = (kind, out, parse_condition(v, text))
+        return out
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+        return ('not', parse_condition(node.operand, text))
+    raise RuleError("cannot read condition '%s'" % text)
+
+def condition_terms(cond):
+    if cond[0] == 'term':
+        return [cond[1]]
+    return [t for c in cond[1:] for t in condition_terms(c)]
+
+class CompiledRules:
+    def __init__(self, flags, terms, variables, order):
+        # flags: list of (flag, set conditions, override conditions), with
+        # each override paired with whether it applies in presence coding.
+        self.flags = flags
+        self.terms = terms
+        self.variables = variables
+        self.order = order
+
+    def eval_terms(self, cols):
+        # Each distinct comparison is evaluated once per frame.
+        return {key: compare(cols[key[0]], key[1], key[2])
+            for key in self.terms if key[0] in cols}
+
+    def evaluate(self, cond, masks):
+        if cond[0] == 'term':
+            return masks[cond[1]]
+        if cond[0] == 'not':
+            return ~self.evaluate(cond[1], masks)
+        a = self.evaluate(cond[1], masks)
+        b = self.evaluate(cond[2], masks)
+        return a & b if cond[0] == 'and' else a | b
+
+    def any_of(self, conds, masks, n):
+        out = np.zeros(n, dtype = bool)
+        for c in conds:
+            out |= self.evaluate(c, masks)
+        return out
+
+    def flag_values(self, frame, presence = False):
+        # Flags as int64 0/1 arrays, keyed by name.
+        missing = [v for v in self.variables if v not in frame.columns]
+        if missing:
+            raise RuleError('variables not in frame: ' + ', '.join(missing))
+        n = frame.shape[0]
+        masks = self.eval_terms({v: frame[v].to_numpy(dtype = 'float64',
+            na_value = np.nan) for v in self.variables})
+        vals = {}
+        for flag, sets, overrides in self.flags:
+            flagged = self.any_of(sets, masks, n)
+            conds = [c for c, kept in overrides if kept or not presence]
+            flagged &= ~self.any_of(conds, masks, n)
+            vals[flag] = flagged.astype('int64')
+            # Comparisons on this flag can now be evaluated.
+            masks.update(self.eval_terms({flag: vals[flag]}))
+        return vals
+
+    def class_values(self, vals, n):
+        out = np.zeros(n, dtype = 'int64')
+        for flag, code in self.order:
+            out[vals[flag] == 1] = code
+        return out
+
+    def apply(self, frame, presence = False):
+        # Frame with the flags and Class (re)coded.
+        vals = self.flag_values(frame, presence)
+        return frame.assign(**vals,
+            Class = self.class_values(vals, frame.shape[0]))
+
+def compile_rules(rules = classrules, order = classorder,
+    presence = presencerules):
+    flagnames = list(dict.fromkeys(flag for flag, value, text in rules))
+    parsed = {flag: ([], []) for flag in flagnames}
+    terms = []
+    for flag, value, text in rules:
+        if value not in (0, 1):
+            raise RuleError("rule for %s sets value %r; rules set 0 or 1" %
+                (flag, value))
+        try:
+            tree = ast.parse(text, mode = 'eval').body
+        except SyntaxError:
+            raise RuleError("cannot parse condition '%s'" % text)
+        cond = parse_condition(tree, text)
+        # A rule may only refer to flags coded before its own.
+        used = condition_terms(cond)
+        for v, op, x in used:
+            if v in parsed and flagnames.index(v) >= flagnames.index(flag):
+                raise RuleError("rule for %s refers to %s, which is not "
+                    "coded before it" % (flag, v))
+        terms += [t for t in used if t not in terms]
+        sets, overrides = parsed[flag]
+        if value == 1:
+            sets.append(cond)
+        else:
+            overrides.append((cond, (flag, text) in presence))
+    for flag, text in presence:
+        if (flag, 0, text) not in rules:
+            raise RuleError("presence rule for %s is not an override in the "
+                "table: '%s'" % (flag, text))
+    for flag, code in order:
+        if flag not in parsed:
+            raise RuleError("class order refers to unknown flag %s" % flag)
+    flags = [(f, parsed[f][0], parsed[f][1]) for f in flagnames]
+    variables = sorted(set(t[0] for t in terms) - set(flagnames))
+    return CompiledRules(flags, terms, variables, order)
@@ -0,0 +1,319 @@
+'''
+A small executor for pipelines of named stages.
+
+Each stage is a function; its inputs are its parameter names, and it returns
+its declared outputs (one value, or a tuple of them). Inputs are either
+outputs of other stages or values given to Pipeline.run, such as file paths.
+
+Stage outputs are memoized on disk (data frames with the cache module,
+anything else pickled), keyed by the stage's code and the keys of its
+inputs. The code key covers the function's source and the source of any
+module in this directory that it refers to, and of the modules in this
+directory that those use in turn, plus the values of plain data globals it
+uses; a given file path is keyed by the file's contents. Keys are
+worked out before anything runs, so a run only loads or computes what the
+requested stages actually need: when just the last stage has changed, only
+its inputs are loaded.
+
+memory_report lists the bytes held by each stage output, for keeping an eye
+on the working set.
+
+Stages whose inputs are ready run concurrently in a thread pool. Most of the
+work is in NumPy, pandas and scikit-learn code that releases the GIL, and
+threads share the stage inputs rather than copying them to other processes.
+Stages must therefore not modify their inputs in place.
+
+Each stage run or load is a step for instrument.py, recorded with the shapes
+of its inputs and outputs when NACC_TRACE is set.
+'''
+
+# Module imports
+import os
+import ast
+import types
+import pickle
+import shutil
+import inspect
+import textwrap
+import concurrent.futures
+import pandas as pd
+import numpy as np
+import cache
+from instrument import step
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def local_module(obj):
+    # The module file in this directory that obj is (or was defined in).
+    mod = obj if isinstance(obj, types.ModuleType) else inspect.getmodule(obj)
+    path = getattr(mod, '__file__', None)
+    if path and os.path.dirname(os.path.abspath(path)) == here:
+        return os.path.abspath(path)
+    return None
+
+def global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= global_names(const)
+    return names
+
+def imported_files(tree):
+    # Module files in this directory imported anywhere in tree (a parsed
+    # module or function, imports inside functions included).
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    paths = [os.path.join(here, name.split('.')[0] + '.py') for name in names]
+    return set(path for path in paths if os.path.isfile(path))
+
+def add_files(paths, files):
+    # Add paths to files, with the module files in this directory that they
+    # import, and that those import in turn.
+    for path in sorted(paths):
+        if path in files:
+            continue
+        files.add(path)
+        with open(path, 'rb') as f:
+            add_files(imported_files(ast.parse(f.read(), path)), files)
+
+def code_key(func):
+    # Key of the function's source, of the local modules it uses (directly
+    # or through other local modules) and of the plain data globals it uses.
+    source = inspect.getsource(func)
+    paths = imported_files(ast.parse(textwrap.dedent(source)))
+    parts = [source]
+    for name in sorted(global_names(func.__code__)):
+        if name not in func.__globals__:
+            continue
+        obj = func.__globals__[name]
+        if isinstance(obj, types.ModuleType) or callable(obj):
+            path = local_module(obj)
+            if path:
+                paths.add(path)
+        else:
+            parts.append(name.encode() + pickle.dumps(obj))
+    files = set()
+    add_files(paths, files)
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            parts.append(f.read())
+    return cache.cache_key(*parts)
+
+def value_bytes(value):
+    # Memory held by a frame, array or sparse matrix (0 for anything else).
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index = False, deep = True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index = False, deep = True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, 'data') and hasattr(value, 'indices'):
+        return int(value.data.nbytes + value.indices.nbytes +
+            value.indptr.nbytes)
+    return 0
+
+def value_key(value):
+    # Given inputs: files by content, directories with a manifest.json (such
+    # as artifact directories; see artifacts.py) by their manifest, anything
+    # else by its pickle.
+    if isinstance(value, str) and os.path.isfile(value):
+        return cache.file_digest(value)
+    if isinstance(value, str) and os.path.isfile(os.path.join(value,
+        'manifest.json')):
+        with open(os.path.join(value, 'manifest.json'), 'rb') as f:
+            return cache.cache_key(f.read())
+    return cache.cache_key(pickle.dumps(value))
+
+def frame_storable(value):
+    # Data frames that cache.save_frame gives back exactly; others (with a
+    # categorical column, say) are pickled.
+    return isinstance(value, pd.DataFrame) and \
+        value.index.equals(pd.RangeIndex(value.shape[0])) and \
+        all(isinstance(c, str) for c in value.columns) and \
+        all(dt == object or dt.kind in 'iufbM' for dt in value.dtypes)
+
+def store(values, path):
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors = True)
+    os.makedirs(tmp)
+    for i, value in enumerate(values):
+        if frame_storable(value):
+            cache.save_frame(value, os.path.join(tmp, '%d' % i))
+        else:
+            with open(os.path.join(tmp, '%d.pkl' % i), 'wb') as f:
+                pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(tmp, 'done'), 'w') as f:
+        f.write('%d\n' % len(values))
+    shutil.rmtree(path, ignore_errors = True)
+    os.replace(tmp, path)
+
+def fetch(path, n):
+    values = []
+    for i in range(n):
+        frame = os.path.join(path, '%d' % i)
+        if cache.has_frame(frame):
+            values.append(cache.load_frame(frame))
+        else:
+            with open(frame + '.pkl', 'rb') as f:
+                values.append(pickle.load(f))
+    return values
+
+class Stage:
+    def __init__(self, func, outputs, memo = True):
+        # memo = False for stages with side effects (writing files, printing)
+        # or that are cheaper to rerun than to store; they run every time
+        # they are needed.
+        self.func = func
+        self.name = func.__name__
+        self.inputs = list(inspect.signature(func).parameters)
+        self.outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+        self.memo = memo
+
+    def __call__(self, values):
+        out = self.func(*[values[v] for v in self.inputs])
+        if len(self.outputs) == 1:
+            out = (out,)
+        if len(out) != len(self.outputs):
+            raise ValueError('stage %s returned %d values for %d outputs' %
+                (self.name, len(out), len(self.outputs)))
+        return dict(zip(self.outputs, out))
+
+class Pipeline:
+    def __init__(self, stages, cache_dir = 'cache', nproc = None):
+        self.stages = {st.name: st for st in stages}
+        self.cache_dir = cache_dir
+        self.nproc = nproc or min(os.cpu_count() or 1, 8)
+        self.memory = []
+        self.producer = {}
+        for st in stages:
+            for v in st.outputs:
+                if v in self.producer:
+                    raise ValueError('%s is an output of both %s and %s' %
+                        (v, self.producer[v], st.name))
+                self.producer[v] = st.name
+
+    def upstream(self, targets):
+        # A pipeline of just the target stages and the stages they depend
+        # on, which needs only their given inputs; its cache entries are the
+        # same as this pipeline's.
+        names = set()
+        def visit(name):
+            if name in names:
+                return
+            names.add(name)
+            for v in self.stages[name].inputs:
+                if v in self.producer:
+                    visit(self.producer[v])
+        for name in targets:
+            visit(name)
+        return Pipeline([st for st in self.stages.values() if st.name in names],
+            self.cache_dir, self.nproc)
+
+    def given(self):
+        # Names of the inputs that no stage produces.
+        return sorted(set(v for st in self.stages.values() for v in st.inputs
+            if v not in self.producer))
+
+    def keys(self, given):
+        # Keys of every value, and of every stage.
+        keys = {v: value_key(x) for v, x in given.items()}
+        stagekeys = {}
+        def visit(name, path = ()):
+            if name in stagekeys:
+                return
+            if name in path:
+                raise ValueError('stages depend on each other: ' +
+                    ' -> '.join(path + (name,)))
+            st = self.stages[name]
+            for v in st.inputs:
+                if v in self.producer:
+                    visit(self.producer[v], path + (name,))
+                elif v not in keys:
+                    raise KeyError('stage %s needs %s, which is neither '
+                        'given nor produced by a stage' % (name, v))
+            key = cache.cache_key(code_key(st.func), *[keys[v] for v in st.inputs])
+            for v in st.outputs:
+                keys[v] = cache.cache_key(key, v)
+            stagekeys[name] = key
+        for name in self.stages:
+            visit(name)
+        return stagekeys
+
+    def entry(self, st, keys):
+        return os.path.join(self.cache_dir, 'stage-%s-%s' % (st.name,
+            keys[st.name]))
+
+    def plan(self, targets, keys):
+        # Stages to load from disk and stages to run for the targets.
+        load, run = set(), set()
+        def visit(name):
+            if name in load or name in run:
+                return
+            st = self.stages[name]
+            if st.memo and os.path.exists(os.path.join(self.entry(st, keys), 'done')):
+                load.add(name)
+                return
+            run.add(name)
+            for v in st.inputs:
+                if v in self.producer:
+                    visit(self.producer[v])
+        for name in targets:
+            visit(name)
+        return load, run
+
+    def run(self, targets = None, **given):
+        # Values of all outputs of the target stages (all stages by default)
+        # and of whatever was loaded or computed on the way.
+        targets = list(self.stages) if targets is None else list(targets)
+        keys = self.keys(given)
+        load, run = self.plan(targets, keys)
+        values = dict(given)
+        waiting = set(load) | set(run)
+        def task(name):
+            st = self.stages[name]
+            if name in load:
+                with step('load ' + name) as s:
+                    out = fetch(self.entry(st, keys), len(st.outputs))
+                    s.output(*out)
+                return dict(zip(st.outputs, out))
+            with step(name, *[values[v] for v in st.inputs]) as s:
+                out = st(values)
+                s.output(*[out[v] for v in st.outputs])
+            if st.memo:
+                os.makedirs(self.cache_dir, exist_ok = True)
+                store([out[v] for v in st.outputs], self.entry(st, keys))
+            return out
+        def ready(name):
+            return name in load or all(v in values for v in
+                self.stages[name].inputs)
+        with concurrent.futures.ThreadPoolExecutor(self.nproc) as pool:
+            running = {}
+            while waiting or running:
+                for name in sorted(n for n in waiting if ready(n)):
+                    waiting.discard(name)
+                    running[pool.submit(task, name)] = name
+                if not running:
+                    raise RuntimeError('stages cannot run: ' +
+                        ', '.join(sorted(waiting)))
+                finished, pending = concurrent.futures.wait(running,
+                    return_when = concurrent.futures.FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    out = fut.result()
+                    values.update(out)
+                    for v, x in out.items():
+                        self.memory.append((name, v, 'load' if name in load
+                            else 'run', value_bytes(x)))
+        return values
+
+    def memory_report(self):
+        # Bytes held by each output of the stages run so far, in the order
+        # they finished.
+        report = pd.DataFrame(self.memory, columns = ['stage', 'output',
+            'source', 'bytes'])
+        report['MB'] = (report.bytes / 2**20).round(1)
+        return report
@@ -0,0 +1,179 @@
+'''
+Fitted preprocessing, saved to disk and applied to new visits.
+
+A Preprocessor holds everything data_prep.py learns while building X: the
+missing-data codes and _couldnt dummies from xvar.csv, which variables were
+kept and how each is typed, the imputed means and medians, the one-hot
+categories, and the final column order. transform turns raw visits (columns
+as in the NACC investigator file) into rows of X, with exactly X's columns;
+transform_one does the same for a single visit given as a dict.
+
+Numeric and ordinal variables can also be standardized after imputation,
+by setting center and scale (one value per variable, numeric then ordinal);
+streaming.py does so. They are None, and X unstandardized, by default.
+
+All the work is done on NumPy arrays, one block per variable type, so a
+single visit takes a few milliseconds and never goes through pandas.
+'''
+
+# Module imports
+import pickle
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from dates import intervalspec
+import harmonize
+from nancodes import nan_groups, dummy_groups
+
+class Preprocessor:
+    def __init__(self, columns, othvar, boolvar, numvar, ordvar, nomvar,
+        means, medians, categories, xvar, harmonizer = None):
+        # columns: X's column names. othvar ... nomvar: the variables passed
+        # through, imputed with 0, the mean or the median, and one-hot
+        # encoded, in X's order. means, medians and categories come from the
+        # fitted imputers and encoder; xvar is the table of kept variables
+        # used to mask missing-data codes, and harmonizer the harmonization
+        # rules (see harmonize.py; those in this directory by default).
+        self.columns = pd.Index(columns)
+        self.othvar = list(othvar)
+        self.boolvar = list(boolvar)
+        self.numvar = list(numvar)
+        self.ordvar = list(ordvar)
+        self.nomvar = list(nomvar)
+        self.means = np.asarray(means, dtype = 'float64')
+        self.medians = np.asarray(medians, dtype = 'float64')
+        self.categories = [np.asarray(c, dtype = 'float64') for c in categories]
+        self.nangroups = nan_groups(xvar)
+        self.dummygroups = dummy_groups(xvar)
+        self.harmonizer = harmonizer if harmonizer is not None \
+            else harmonize.read_spec()
+        # No standardization until center and scale are set.
+        self.center = None
+        self.scale = None
+        self.compile()
+
+    def compile(self):
+        # Index arrays into the block of model variables, worked out once.
+        self.modelvar = [*self.othvar, *self.boolvar, *self.numvar,
+            *self.ordvar, *self.nomvar]
+        pos = {v: i for i, v in enumerate(self.modelvar)}
+        self.masks = [(codes, np.array([pos[v] for v in vv if v in pos]))
+            for codes, vv in self.nangroups.items()]
+        self.masks = [(codes, idx) for codes, idx in self.masks if len(idx)]
+        self.dummies = [(pos[v + '_couldnt'], v, codes)
+            for codes, vv in self.dummygroups.items() for v in vv
+            if v + '_couldnt' in pos]
+        dummyvar = set(v + '_couldnt' for codes, vv in
+            self.dummygroups.items() for v in vv)
+        self.intervals = [spec for spec in intervalspec if spec[0] in pos]
+        k = [len(self.othvar), len(self.boolvar), len(self.numvar),
+            len(self.ordvar), len(self.nomvar)]
+        ends = np.cumsum(k)
+        self.blocks = [slice(e - n, e) for e, n in zip(ends, k)]
+        # Numeric and ordinal variables, the ones imputed from statistics.
+        self.imputes = slice(self.blocks[2].start, self.blocks[3].stop)
+        offsets = np.cumsum([0] + [len(c) for c in self.categories])
+        self.ohe_offset = offsets[:-1]
+        nout = ends[3] + offsets[-1]
+        if nout != len(self.columns):
+            raise ValueError('variables give %d columns but X has %d' %
+                (nout, len(self.columns)))
+        # Raw variables a visit needs to supply.
+        derived = set(self.harmonizer.added) | dummyvar | \
+            set(spec[0] for spec in intervalspec)
+        need = [v for v in self.modelvar if v not in derived]
+        need += [v for v, codes in [spec[1] for spec in self.intervals] +
+            [spec[2] for spec in self.intervals]]
+        need += [v for codes, vv in self.dummygroups.items() for v in vv]
+        need += self.harmonizer.inputs
+        self.inputs = list(dict.fromkeys(need))
+
+    def derive(self, cols):
+        # Intervals and harmonized variables, as in data_prep.py.
+        n = len(next(iter(cols.values())))
+        for name, (v1, codes1), (v2, codes2) in self.intervals:
+            x1 = np.where(np.isin(cols[v1], codes1), np.nan, cols[v1])
+            x2 = np.where(np.isin(cols[v2], codes2), np.nan, cols[v2])
+            cols[name] = x1 - x2
+        cols.update({v: np.asarray(x, dtype = 'float64')
+            for v, x in self.harmonizer(cols).items()})
+        return n
+
+    def masked_arrays(self, cols):
+        # The model variables side by side, with missing-data codes set to
+        # NaN but nothing imputed yet. cols: dict of float64 arrays for (at
+        # least) self.inputs.
+        n = self.derive(cols)
+        A = np.empty((n, len(self.modelvar)))
+        for j, v in enumerate(self.modelvar):
+            if v in cols:
+                A[:,j] = cols[v]
+        # The _couldnt dummies come from the values before masking.
+        for j, v, codes in self.dummies:
+            A[:,j] = np.isin(cols[v], codes)
+        for codes, idx in self.masks:
+            block = A[:,idx]
+            block[np.isin(block, codes)] = np.nan
+            A[:,idx] = block
+        return A
+
+    def filled(self, V):
+        # The numeric and ordinal columns (V, as A[:,imputes]) imputed with
+        # the means and medians, and standardized if center and scale are
+        # set: X's columns imputes.
+        V = np.where(np.isnan(V), np.concatenate([self.means, self.medians]), V)
+        if self.scale is not None:
+            V = (V - self.center) / self.scale
+        return V
+
+    def imputed(self, A):
+        # Rows of X from masked_arrays' output.
+        n = A.shape[0]
+        oth, boo, nom = [A[:,b] for b in [self.blocks[0], self.blocks[1],
+            self.blocks[4]]]
+        boo = np.where(np.isnan(boo), 0, boo)
+        nom = np.where(np.isnan(nom), 0, nom)
+        ohe = np.zeros((n, self.ohe_offset[-1] + len(self.categories[-1])) if
+            self.categories else (n, 0))
+        rows = np.arange(n)
+        for j, cats in enumerate(self.categories):
+            at = np.searchsorted(cats, nom[:,j])
+            hit = at < len(cats)
+            hit[hit] = cats[at[hit]] == nom[hit,j]
+            ohe[rows[hit], self.ohe_offset[j] + at[hit]] = 1
+        return np.hstack([oth, boo, self.filled(A[:,self.imputes]), ohe])
+
+    def transform_arrays(self, cols):
+        return self.imputed(self.masked_arrays(cols))
+
+    def batch_arrays(self, batch):
+        # A data frame of raw visits as a dict of float64 columns.
+        cols = {v: batch[v].to_numpy(dtype = 'float64', na_value = np.nan)
+            for v in self.inputs if v in batch.columns}
+        missing = [v for v in self.inputs if v not in cols]
+        if missing:
+            raise KeyError('visits are missing variables: ' +
+                ', '.join(missing))
+        return cols
+
+    def transform(self, batch):
+        # Rows of X (as a CSR matrix) for a data frame of raw visits.
+        return sparse.csr_matrix(self.transform_arrays(self.batch_arrays(batch)))
+
+    def transform_one(self, record):
+        # One row of X (as a 1-D array) for a single visit given as a dict.
+        # Variables not in the record count as missing.
+        cols = {}
+        for v in self.inputs:
+            x = record.get(v)
+            cols[v] = np.array([np.nan if x is None else float(x)])
+        return self.transform_arrays(cols)[0]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
@@ -0,0 +1,157 @@
+'''
+Batch scoring of preprocessed visits with the saved WOVR classifier.
+
+The classifier from the original study (the model part of its artifact
+directory, or the first item of weovr_classifier_og_data.pickle) takes the
+features named in selected_features.csv, in that order. score_matrix picks
+those columns out of a feature matrix by name (X's column names come from
+the preprocessor that made it), splits the rows into chunks and scores the
+chunks in a pool of worker processes.
+
+The model and the feature matrix are set as module globals before the pool
+is started, so forked workers share them read-only (copy on write) rather
+than receiving pickled copies; only row ranges go to the workers and only
+predictions come back. The matrix can be a memory-mapped .npy file (from
+streaming.py), so a whole freeze need not be in memory. Results are written
+to memory-mapped .npy files as the chunks finish, in any order, so they are
+on disk in full when scoring ends. Each worker scores its chunks on one core
+(n_jobs is set to 1 in a copy of the model, the caller's model is left as it
+is), so throughput grows with the number of workers up to the number of
+cores.
+
+Usage:
+
+    python scoring.py X.npy [output directory] [--preprocessor
+        preprocessor.pkl] [--classifier weovr_classifier_og_data.pickle]
+        [--selected selected_features.csv] [--chunksize 10000] [--nproc N]
+        [--proba]
+
+X may also be a .npz sparse matrix (as freeze.py saves). The output
+directory gets pred.npy and, with --proba, proba.npy.
+'''
+
+# Module imports
+import os
+import copy
+import argparse
+import multiprocessing
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from preprocess import Preprocessor
+from artifacts import open_parts
+
+# Model, features and selected columns shared with worker processes, set by
+# share_model.
+shared = {}
+
+def share_model(model, X, cols, proba):
+    shared['model'] = model
+    shared['X'] = X
+    shared['cols'] = cols
+    shared['proba'] = proba
+
+def single_core(model):
+    # A copy of the model that, like the fitted estimators inside it, uses
+    # one core, so that workers do not compete for cores. The copies are
+    # shallow (the fitted trees are shared), and the model itself is left
+    # as it was.
+    if not hasattr(model, 'get_params'):
+        return model
+    model = copy.copy(model)
+    if getattr(model, 'n_jobs', None) is not None:
+        model.n_jobs = 1
+    for name in ['estimator_', 'estimators_', 'final_estimator_']:
+        inner = getattr(model, name, None)
+        if isinstance(inner, (list, tuple)):
+            setattr(model, name, type(inner)(single_core(est) for est in inner))
+        elif inner is not None:
+            setattr(model, name, single_core(inner))
+    return model
+
+def load_classifier(path = 'weovr_classifier_og_data.pickle'):
+    # From an artifact directory (see artifacts.py) or the original pickle.
+    return open_parts(path)['model']
+
+def selected_columns(columns, selected = 'selected_features.csv'):
+    # Positions in columns of the classifier's features, in its order.
+    feat = list(pd.read_csv(selected, nrows = 0).columns)
+    at = pd.Index(columns).get_indexer(feat)
+    if (at < 0).any():
+        raise KeyError('features not in X: ' +
+            ', '.join(f for f, i in zip(feat, at) if i < 0))
+    return at
+
+def load_matrix(path):
+    # A .npy file memory-mapped, or a .npz sparse matrix as CSR.
+    if path.endswith('.npz'):
+        return sparse.load_npz(path).tocsr()
+    return np.load(path, mmap_mode = 'r')
+
+def score_chunk(task):
+    # Predictions (and class probabilities) for rows start:stop.
+    start, stop = task
+    X = shared['X'][start:stop]
+    X = X[:,shared['cols']]
+    X = X.toarray() if sparse.issparse(X) else np.asarray(X)
+    model = shared['model']
+    pred = model.predict(X)
+    proba = model.predict_proba(X) if shared['proba'] else None
+    return start, stop, pred, proba
+
+def score_matrix(model, X, cols, out_dir = 'scores', chunksize = 10000,
+    nproc = None, proba = False):
+    # Score the rows of X on the columns cols, writing out_dir/pred.npy
+    # (and proba.npy); returns them memory-mapped.
+    os.makedirs(out_dir, exist_ok = True)
+    n = X.shape[0]
+    tasks = [(i, min(i + chunksize, n)) for i in range(0, n, chunksize)]
+    nproc = nproc or os.cpu_count() or 1
+    if nproc > 1:
+        model = single_core(model)
+    share_model(model, X, cols, proba)
+    out = {}
+    def opened(name, dtype, shape):
+        if name not in out:
+            out[name] = np.lib.format.open_memmap(os.path.join(out_dir,
+                name + '.npy'), mode = 'w+', dtype = dtype, shape = shape)
+        return out[name]
+    pool = None
+    try:
+        if nproc > 1 and len(tasks) > 1:
+            pool = multiprocessing.get_context('fork').Pool(min(nproc,
+                len(tasks)))
+            results = pool.imap_unordered(score_chunk, tasks)
+        else:
+            results = map(score_chunk, tasks)
+        for start, stop, pred, prob in results:
+            opened('pred', pred.dtype, (n,))[start:stop] = pred
+            if prob is not None:
+                opened('proba', 'float32', (n, prob.shape[1]))[start:stop] = prob
+    finally:
+        if pool is not None:
+            pool.terminate()
+        shared.clear()
+    for x in out.values():
+        x.flush()
+    return out.get('pred'), out.get('proba')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('X')
+    parser.add_argument('out_dir', nargs = '?', default = 'scores')
+    parser.add_argument('--preprocessor', default = 'preprocessor.pkl')
+    parser.add_argument('--classifier',
+        default = 'weovr_classifier_og_data.pickle')
+    parser.add_argument('--selected', default = 'selected_features.csv')
+    parser.add_argument('--chunksize', type = int, default = 10000)
+    parser.add_argument('--nproc', type = int)
+    parser.add_argument('--proba', action = 'store_true')
+    args = parser.parse_args()
+    X = load_matrix(args.X)
+    cols = selected_columns(Preprocessor.load(args.preprocessor).columns,
+        args.selected)
+    pred, prob = score_matrix(load_classifier(args.classifier), X, cols,
+        args.out_dir, args.chunksize, args.nproc, args.proba)
+    print('%d visits scored; predictions in %s' % (len(pred),
+        os.path.join(args.out_dir, 'pred.npy')))
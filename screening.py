@@ -0,0 +1,102 @@
+'''
+Screening report for low-information variables.
+
+screen_columns makes one pass over the numeric columns of the cohort and
+gives, per column:
+
+    count       observed (non-missing) values;
+    distinct    distinct observed values;
+    variance    variance of the observed values;
+    codefrac    share of visits whose value was a missing-data code;
+    mi          mutual information with Class (in nats), with the column's
+                observed values cut into up to nbins bins of about equal
+                size (one per value if there are no more than nbins of
+                them) and missing values a bin of their own.
+
+Columns go in blocks to a thread pool; sorting each block once gives the
+distinct counts and the bin edges. drop_columns turns the report into a drop
+list from the thresholds given; only the minimum count of observed values is
+set by default, as in the original script.
+'''
+
+# Module imports
+import os
+import concurrent.futures
+import pandas as pd
+import numpy as np
+
+# Drop a column if it has fewer observed values, distinct values, less
+# variance or mutual information with Class than these, or a larger share of
+# missing-data codes. None turns a test off.
+thresholds = {'count': 100, 'distinct': None, 'variance': None,
+    'codefrac': None, 'mi': None}
+
+def mutual_information(codes, ncodes, y, ny):
+    # Mutual information of two integer codings of the same rows.
+    table = np.bincount(codes * ny + y, minlength = ncodes * ny)
+    p = table.reshape(ncodes, ny) / len(codes)
+    outer = p.sum(axis = 1)[:,None] * p.sum(axis = 0)[None,:]
+    hit = p > 0
+    return float((p[hit] * np.log(p[hit] / outer[hit])).sum())
+
+def block_stats(B, R, y, ny, nbins):
+    # Report rows for the columns of B (masked values), with R the same
+    # columns before masking.
+    n, k = B.shape
+    obs = ~np.isnan(B)
+    count = obs.sum(axis = 0)
+    S = np.sort(B, axis = 0)
+    step = (np.diff(S, axis = 0) != 0) & ~np.isnan(S[1:])
+    distinct = step.sum(axis = 0) + (count > 0)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mean = np.where(obs, B, 0).sum(axis = 0) / count
+        variance = np.where(obs, (B - mean)**2, 0).sum(axis = 0) / (count - 1)
+    variance[count < 2] = np.nan
+    codefrac = (~np.isnan(R) & ~obs).sum(axis = 0) / max(n, 1)
+    mi = np.zeros(k)
+    for j in range(k):
+        c = count[j]
+        if c == 0:
+            continue
+        s = S[:c,j]
+        if distinct[j] <= nbins:
+            edges = np.unique(s)
+            code = np.searchsorted(edges, B[:,j])
+        else:
+            edges = np.unique(s[(np.arange(1, nbins) * c) // nbins])
+            code = np.searchsorted(edges, B[:,j], side = 'right')
+        code[~obs[:,j]] = len(edges) + 1
+        mi[j] = mutual_information(code, len(edges) + 2, y, ny)
+    return np.column_stack([count, distinct, variance, codefrac, mi])
+
+def screen_columns(masked, raw, y, nbins = 10, blocksize = 32, nproc = None):
+    # Report (one row per numeric column of masked) with raw the same
+    # visits before their missing-data codes were masked, and y the class.
+    cols = [v for v in masked.columns if masked[v].dtype.kind in 'iuf']
+    y, yvalues = pd.factorize(pd.Series(y), use_na_sentinel = False)
+    blocks = [cols[i:i + blocksize] for i in range(0, len(cols), blocksize)]
+    def task(vv):
+        # Columns added in masking (the _couldnt dummies) have no codes.
+        B = masked[vv].to_numpy(dtype = 'float64')
+        R = np.column_stack([raw[v].to_numpy(dtype = 'float64') if v in
+            raw.columns else B[:,j] for j, v in enumerate(vv)])
+        return block_stats(B, R, y, len(yvalues), nbins)
+    nproc = nproc or min(os.cpu_count() or 1, 8)
+    with concurrent.futures.ThreadPoolExecutor(nproc) as pool:
+        stats = list(pool.map(task, blocks))
+    report = pd.DataFrame(np.vstack(stats) if stats else np.empty((0, 5)),
+        index = pd.Index(cols, name = 'variable'),
+        columns = ['count', 'distinct', 'variance', 'codefrac', 'mi'])
+    return report.astype({'count': 'int64', 'distinct': 'int64'})
+
+def drop_columns(report, thresholds = thresholds):
+    # Columns of the report failing any of the thresholds.
+    drop = np.zeros(report.shape[0], dtype = bool)
+    for stat, limit in thresholds.items():
+        if limit is None:
+            continue
+        if stat == 'codefrac':
+            drop |= (report[stat] > limit).to_numpy()
+        else:
+            drop |= ~(report[stat] >= limit).to_numpy()
+    return report.index[drop]
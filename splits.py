@@ -0,0 +1,148 @@
+'''
+Train/CV/validation/test splits by participant, and cross-validation folds.
+
+Visits of the same participant are much alike, so splitting visits lets a
+participant's visits land on both sides of a split. Here whole participants
+are assigned to a part, stratified by pathology class, sex and education
+(more than 12 years, or not) at their first visit. Strata are integer codes
+built from the columns directly, not joined strings.
+
+Within each stratum, participants are put in random order and dealt out to
+the parts in proportion to their shares, starting at a random offset, so
+each stratum's participants are split as evenly as their number allows.
+The same dealing over the CV part gives stratified k-fold cross-validation
+folds, again by participant.
+
+Splits are arrays of row numbers into X (int32). The folds are a list of
+(train, test) pairs of row numbers into X as well, so
+
+    cross_val_score(clf, X, y, cv = folds)
+
+runs on X and y themselves, without copies of the CV rows. save_splits writes
+them all to one .npz file, and load_splits reads them back.
+
+Row numbers only hold for the X they were made for. The freeze state (see
+freeze.py) instead keeps each row's part and fold as columns of its rows
+table (part_columns), which travel with the rows as visits are dropped and
+added. New visits of a participant already there join that participant's
+part and fold, and new participants are dealt out as above (assign_parts).
+splits_from_parts gives the row numbers back for the current X.
+'''
+
+# Module imports
+import numpy as np
+import pandas as pd
+
+# Shares of participants for the CV, validation and test parts, as in the
+# original 80/20 split of which a quarter of the training part was held out
+# for validation.
+shares = {'cv': 0.6, 'val': 0.2, 'test': 0.2}
+
+def strata_codes(frame):
+    # Integer code of each row's (Class, SEX, HighEd) stratum, numbered in
+    # the sorted order of the strata. Each column is ranked, and the ranks
+    # combined into one integer key, which sorts as the strata do.
+    key = np.zeros(frame.shape[0], dtype = 'int64')
+    for x in [frame.Class.to_numpy(), frame.SEX.to_numpy(),
+        frame.EDUC.to_numpy(dtype = 'float64') > 12]:
+        values, rank = np.unique(x, return_inverse = True)
+        key = key * len(values) + rank
+    return np.unique(key, return_inverse = True)[1]
+
+def deal(strata, shares, rng):
+    # Part (index into shares) of each item, dealing the items of each
+    # stratum out in random order from a random starting point.
+    m = len(strata)
+    order = np.lexsort((rng.random(m), strata))
+    s = strata[order]
+    row = np.arange(m)
+    new = np.ones(m, dtype = bool)
+    new[1:] = s[1:] != s[:-1]
+    rank = row - np.maximum.accumulate(np.where(new, row, 0))
+    count = np.bincount(s)
+    offset = rng.random(len(count))
+    pos = (rank + offset[s]) / count[s]
+    part = np.empty(m, dtype = 'int64')
+    part[order] = np.searchsorted(np.cumsum(shares)[:-1], pos, side = 'right')
+    return part
+
+def subject_splits(frame, k = 5, seed = 666):
+    # Rows of each part, by participant, and k folds over the CV part.
+    rng = np.random.default_rng(seed)
+    sub = pd.factorize(frame.NACCID)[0]
+    firstrow = np.unique(sub, return_index = True)[1]
+    strata = strata_codes(frame)[firstrow]
+    part = deal(strata, list(shares.values()), rng)[sub]
+    rows = {name: np.flatnonzero(part == i).astype('int32')
+        for i, name in enumerate(shares)}
+
+    # Folds over the participants in the CV part.
+    incv = np.flatnonzero(part[firstrow] == 0)
+    fold = np.full(len(firstrow), -1)
+    fold[incv] = deal(strata[incv], [1 / k] * k, rng)
+    fold = fold[sub]
+    folds = [(np.flatnonzero((fold != i) & (fold >= 0)).astype('int32'),
+        np.flatnonzero(fold == i).astype('int32')) for i in range(k)]
+    return rows, folds
+
+def save_splits(path, rows, folds):
+    arrays = {'rows_' + name: x for name, x in rows.items()}
+    for i, (train, test) in enumerate(folds):
+        arrays['fold%d_train' % i] = train
+        arrays['fold%d_test' % i] = test
+    np.savez(path, **arrays)
+
+def load_splits(path):
+    # rows and folds, as from subject_splits.
+    with np.load(path) as f:
+        rows = {name[5:]: f[name] for name in f.files if name.startswith('rows_')}
+        k = sum(name.endswith('_test') and name.startswith('fold')
+            for name in f.files)
+        folds = [(f['fold%d_train' % i], f['fold%d_test' % i]) for i in range(k)]
+    return rows, folds
+
+def part_columns(n, rows, folds):
+    # Part (index into shares) and CV fold (-1 outside the CV part) of each
+    # of n rows, from row numbers as given by subject_splits.
+    part = np.full(n, -1, dtype = 'int8')
+    for i, name in enumerate(shares):
+        part[rows[name]] = i
+    fold = np.full(n, -1, dtype = 'int8')
+    for i, (train, test) in enumerate(folds):
+        fold[test] = i
+    return part, fold
+
+def splits_from_parts(part, fold):
+    # rows and folds, as from subject_splits, from part and fold columns.
+    part, fold = np.asarray(part), np.asarray(fold)
+    rows = {name: np.flatnonzero(part == i).astype('int32')
+        for i, name in enumerate(shares)}
+    k = int(fold.max()) + 1
+    folds = [(np.flatnonzero((fold != i) & (fold >= 0)).astype('int32'),
+        np.flatnonzero(fold == i).astype('int32')) for i in range(k)]
+    return rows, folds
+
+def assign_parts(frame, known, k = 5, seed = 666):
+    # Part and fold of each row of frame (new visits, with Class, SEX and
+    # EDUC), given known: a frame of NACCID, part and fold for participants
+    # already split. Other participants are dealt out, stratified as in
+    # subject_splits.
+    rng = np.random.default_rng([seed, len(known)])
+    known = known.drop_duplicates('NACCID').set_index('NACCID')
+    at = known.index.get_indexer(frame.NACCID)
+    new = at < 0
+    part = np.full(len(at), -1, dtype = 'int8')
+    fold = np.full(len(at), -1, dtype = 'int8')
+    part[~new] = known.part.to_numpy()[at[~new]]
+    fold[~new] = known.fold.to_numpy()[at[~new]]
+    if new.any():
+        sub = pd.factorize(frame.NACCID[new])[0]
+        firstrow = np.unique(sub, return_index = True)[1]
+        strata = strata_codes(frame.loc[new])[firstrow]
+        newpart = deal(strata, list(shares.values()), rng)
+        newfold = np.full(len(firstrow), -1)
+        incv = np.flatnonzero(newpart == 0)
+        newfold[incv] = deal(strata[incv], [1 / k] * k, rng)
+        part[new] = newpart[sub]
+        fold[new] = newfold[sub]
+    return part, fold
@@ -0,0 +1,176 @@
+'''
+Out-of-core imputation, standardization and encoding of the cohort.
+
+data_prep.py fits the imputers and the one-hot encoder on the whole cohort
+in memory. This does the same in two passes over the investigator file,
+chunk by chunk, so that memory is bounded by the chunk size rather than by
+the size of the data:
+
+    1. Each chunk is selected and class coded as in cohort.py, and its
+       model variables masked as in preprocess.py. Mergeable statistics are
+       collected: counts and sums of the numeric variables and value counts
+       of the ordinal ones (as freeze.py keeps them, from which the means
+       and exact medians follow), counts, means and sums of squared
+       deviations of both (merged with Welford's method, for
+       standardizing), and the values seen of each nominal variable.
+    2. Each chunk is imputed, standardized and one-hot encoded with the
+       refitted statistics, and written to its rows of X.npy, a float32
+       array preallocated on disk and written through a memory map.
+
+Ordinal variables take a handful of integer values, so their value counts
+are small and give exact medians; no approximate quantile sketch is needed.
+
+Which variables are used and how each is typed comes from a preprocessor
+fitted by data_prep.py (on the full cohort or on a sample of it); the
+statistics and one-hot categories are refitted from the stream, so X's
+columns follow the categories seen. Without standardizing, the output
+matches the rows of X from data_prep.py on the same data, up to rounding to
+float32. The output directory holds X.npy (load it with
+np.load('X.npy', mmap_mode = 'r')), rows.csv (NACCID, VISITDATE and Class of
+each row) and the refitted preprocessor.pkl. Usage:
+
+    python streaming.py investigator.csv [output directory]
+        [--preprocessor preprocessor.pkl] [--chunksize 10000] [--raw]
+        [--coding corrected|legacy]
+'''
+
+# Module imports
+import os
+import copy
+import argparse
+import pandas as pd
+import numpy as np
+from cohort import read_chunks, code_classes
+from freeze import summaries, merge_summaries, refit_statistics, visit_keys
+from preprocess import Preprocessor
+from instrument import step
+
+def cohort_chunks(path, xvar, chunksize = 10000, coding = 'corrected'):
+    # Class-coded cohort rows, chunk by chunk.
+    for chunk in read_chunks(path, xvar, chunksize):
+        yield code_classes(chunk, coding)
+
+def moments(V):
+    # Count, mean and sum of squared deviations of the observed values of
+    # each column.
+    obs = ~np.isnan(V)
+    n = obs.sum(axis = 0)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mean = np.where(obs, V, 0).sum(axis = 0) / n
+    mean = np.where(n > 0, mean, 0)
+    m2 = np.where(obs, (V - mean)**2, 0).sum(axis = 0)
+    return {'n': n, 'mean': mean, 'm2': m2}
+
+def merge_moments(a, b):
+    # Moments of two sets of values together (Chan et al.'s update).
+    n = a['n'] + b['n']
+    d = b['mean'] - a['mean']
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mean = np.where(n > 0, a['mean'] + d * b['n'] / n, 0)
+        m2 = a['m2'] + b['m2'] + np.where(n > 0, d**2 * a['n'] * b['n'] / n, 0)
+    return {'n': n, 'mean': mean, 'm2': m2}
+
+def category_name(v, c, floats = True):
+    # One-hot column name of category c (a float) of nominal variable v, as
+    # OneHotEncoder.get_feature_names_out gives it.
+    return '%s_%s' % (v, c if floats or c != int(c) else int(c))
+
+def fit_stream(template, chunks, standardize = True):
+    # A copy of the template preprocessor with its statistics, categories
+    # and columns refitted from the chunks, and the number of rows.
+    prep = copy.deepcopy(template)
+    prep.center = prep.scale = None
+    summ = mom = None
+    vocab = [np.empty(0) for v in prep.nomvar]
+    nrows = 0
+    for chunk in chunks:
+        with step('stream fit', chunk):
+            A = prep.masked_arrays(prep.batch_arrays(chunk))
+            V = A[:,prep.imputes]
+            s, m = summaries(V, prep), moments(V)
+            summ = s if summ is None else merge_summaries(summ, s)
+            mom = m if mom is None else merge_moments(mom, m)
+            nom = A[:,prep.blocks[4]]
+            nom = np.where(np.isnan(nom), 0, nom)
+            vocab = [np.union1d(c, x) for c, x in zip(vocab, nom.T)]
+            nrows += A.shape[0]
+    if summ is None:
+        raise ValueError('no visits to fit')
+    refit_statistics(prep, summ)
+    # One-hot columns keep the template's names; new categories are named
+    # as the encoder names them, variable_category with the category as the
+    # encoder saw it: 1.0 for a float column (one with missing values), 1 for
+    # an integer one. Which it was shows in the template's names.
+    start = prep.ohe_offset + prep.blocks[3].stop
+    names = {(v, c): prep.columns[at + i] for v, cats, at in
+        zip(prep.nomvar, prep.categories, start) for i, c in enumerate(cats)}
+    floats = {v: all(names[v, c] == '%s_%s' % (v, c) for c in cats)
+        for v, cats in zip(prep.nomvar, prep.categories)}
+    prep.categories = vocab
+    prep.columns = pd.Index([*prep.othvar, *prep.boolvar, *prep.numvar,
+        *prep.ordvar, *[names.get((v, c), category_name(v, c, floats[v]))
+        for v, cats in zip(prep.nomvar, vocab) for c in cats]])
+    prep.compile()
+    if standardize:
+        # As StandardScaler: mean and standard deviation of the observed
+        # values, with constant variables left unscaled.
+        with np.errstate(invalid = 'ignore'):
+            sd = np.sqrt(mom['m2'] / mom['n'])
+        prep.center = mom['mean']
+        prep.scale = np.where(np.isfinite(sd) & (sd > 0), sd, 1.0)
+    return prep, nrows
+
+def transform_stream(prep, chunks, nrows, out_dir):
+    # Rows of X for the chunks, written to out_dir/X.npy, with their keys
+    # and classes in out_dir/rows.csv.
+    X = np.lib.format.open_memmap(os.path.join(out_dir, 'X.npy'), mode = 'w+',
+        dtype = 'float32', shape = (nrows, len(prep.columns)))
+    rowfile = os.path.join(out_dir, 'rows.csv')
+    at = 0
+    for chunk in chunks:
+        with step('stream transform', chunk) as s:
+            rows = prep.transform_arrays(prep.batch_arrays(chunk))
+            if at + rows.shape[0] > nrows:
+                raise ValueError('more visits than in the first pass')
+            X[at:at + rows.shape[0]] = rows
+            keys = visit_keys(chunk).to_frame(index = False)
+            keys['Class'] = chunk.Class.to_numpy()
+            keys.to_csv(rowfile, mode = 'w' if at == 0 else 'a',
+                header = at == 0, index = False)
+            at += rows.shape[0]
+            s.output(rows)
+    if at != nrows:
+        raise ValueError('%d visits in the second pass but %d in the first' %
+            (at, nrows))
+    X.flush()
+    return X
+
+def stream_features(path, out_dir = 'stream', template = 'preprocessor.pkl',
+    xvar_path = 'xvar.csv', chunksize = 10000, standardize = True,
+    coding = 'corrected'):
+    # Both passes over the investigator file at path.
+    xvar = pd.read_csv(xvar_path)
+    prep, nrows = fit_stream(Preprocessor.load(template),
+        cohort_chunks(path, xvar, chunksize, coding), standardize)
+    os.makedirs(out_dir, exist_ok = True)
+    X = transform_stream(prep, cohort_chunks(path, xvar, chunksize, coding),
+        nrows, out_dir)
+    prep.save(os.path.join(out_dir, 'preprocessor.pkl'))
+    return prep, X
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('investigator')
+    parser.add_argument('out_dir', nargs = '?', default = 'stream')
+    parser.add_argument('--preprocessor', default = 'preprocessor.pkl')
+    parser.add_argument('--chunksize', type = int, default = 10000)
+    parser.add_argument('--raw', action = 'store_true',
+        help = 'impute and encode without standardizing')
+    parser.add_argument('--coding', choices = ['corrected', 'legacy'],
+        default = 'corrected', help = 'class coding (see pathrules.py)')
+    args = parser.parse_args()
+    prep, X = stream_features(args.investigator, args.out_dir,
+        args.preprocessor, chunksize = args.chunksize,
+        standardize = not args.raw, coding = args.coding)
+    print('%d rows, %d columns written to %s' % (X.shape[0], X.shape[1],
+        os.path.join(args.out_dir, 'X.npy')))
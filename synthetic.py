@@ -0,0 +1,188 @@
+'''
+Synthetic visits in the layout of the NACC investigator file.
+
+The NACC data are restricted, so this writes a stand-in with the same
+columns, for running and benchmarking the pipeline anywhere. Variables are
+drawn according to xvar.csv: Boolean, Ordinal and Nominal variables as codes
+within their number of values, Numeric variables over a range suggested by
+their missing-data codes (ages where 888 is a code, years where 8888 is, and
+so on), each mixed with its own missing-data codes. Participants have one or
+more yearly visits, with birth, death and neuropathology fields constant
+across them; about a third have autopsy data, whose neuropathology codes
+cover all the pathology classes. DRUG1..DRUG40 list a handful of drug names
+per visit, including the spelling variants and combination products that
+drugs.py deals with.
+
+Rows are written in chunks, so any size can be produced in bounded memory.
+
+Usage: python synthetic.py nrows [output.csv] [seed]
+'''
+
+# Module imports
+import os
+import sys
+import pandas as pd
+import numpy as np
+from variables import npvar, idvar, datevar, selectvar, drugvar, textvar
+from nancodes import parse_codes
+
+# Drug names as they turn up in DRUG1..DRUG40.
+drugnames = ['donepezil', 'Donepezil', 'memantine', 'aspirin',
+    'multivitamin with minerals', 'multivitamin', 'omega-3',
+    'carbidopa-levodopa', 'levodopa', 'vitamin-d', 'vitamin d',
+    'lisinopril', 'hydrochlorothiazide-lisinopril', 'atorvastatin',
+    'simvastatin', 'metformin', 'sertraline', 'citalopram', 'levothyroxine',
+    'calcium with vitamins d and k', 'acetyl-l-carnitine', 'rivastigmine',
+    'galantamine', 'quetiapine', 'lorazepam', 'insulin glargine',
+    'aloe vera topical', '*not codable*']
+
+# Free-text values.
+textvalues = {'HISPORX': ['Mexican', 'spanish', 'Puerto Rican', 'Cuban'],
+    'RACEX': ['Hispanic', 'multi racial', 'puerto rican', 'guam - chamorro']}
+
+# Neuropathology variables with their own codes, then the share of each.
+npcodes = {'NPADNC': ([0, 1, 2, 3, 8, 9], [.15, .2, .25, .3, .05, .05]),
+    'NPLBOD': ([0, 1, 2, 3, 4, 5, 8, 9], [.5, .08, .12, .12, .05, .05, .04, .04]),
+    'NACCBRAA': ([0, 1, 2, 3, 4, 5, 6, 8, 9], [.05, .1, .1, .15, .15, .2, .15, .05, .05]),
+    'NPTHAL': ([0, 1, 2, 3, 4, 5, 8, 9, -4], [.1, .15, .15, .15, .15, .15, .05, .05, .05]),
+    'NACCNEUR': ([0, 1, 2, 3, 8, 9], [.15, .2, .25, .3, .05, .05])}
+npgeneric = ([0, 1, 2, 8, 9, -4], [.7, .08, .04, .04, .04, .1])
+
+def value_range(codes):
+    # Range of a Numeric variable, guessed from its missing-data codes, and
+    # whether it takes decimals.
+    decimals = any(c != int(c) for c in codes)
+    if any(c >= 8888 for c in codes):
+        return 1950, 2019, decimals
+    if any(995 <= c <= 998 for c in codes):
+        return 0, 300, decimals
+    if any(c >= 888 for c in codes):
+        return 20, 95, decimals
+    if any(95 <= c <= 98 for c in codes):
+        return 0, 30, decimals
+    if any(c >= 88 for c in codes):
+        return 0, 60, decimals
+    return 0, 100, decimals
+
+def with_codes(rng, x, codes, share):
+    # Replace a share of the values with the variable's missing-data codes.
+    if not codes or share == 0:
+        return x
+    hit = rng.random(len(x)) < share
+    x = x.astype('float64') if any(c != int(c) for c in codes) else x
+    x[hit] = rng.choice(np.array(codes), hit.sum())
+    return x
+
+def subjects(rng, n, first_id):
+    # Participants with one or more visits, until there are n visits.
+    nvisits = np.minimum(rng.geometric(0.35, n), 10)
+    nsub = np.searchsorted(np.cumsum(nvisits), n) + 1
+    nvisits = nvisits[:nsub]
+    nvisits[-1] -= nvisits.sum() - n
+    sub = np.repeat(np.arange(nsub), nvisits)
+    # Visit number within participant.
+    starts = np.repeat(np.cumsum(nvisits) - nvisits, nvisits)
+    return sub, np.arange(n) - starts, nvisits, first_id + nsub
+
+def visit_frame(rng, n, xvar, first_id = 0):
+    # n synthetic visits; returns the frame and the next free participant id.
+    sub, visitno, nvisits, next_id = subjects(rng, n, first_id)
+    nsub = len(nvisits)
+    cols = {}
+    for v, t, nv, text in zip(xvar.Variable, xvar.Type, xvar.Nvalues,
+        xvar.NaNValues):
+        codes = list(parse_codes(text))
+        share = rng.uniform(0, 0.3)
+        nv = int(nv) if nv == nv else 4
+        if t == 'Boolean':
+            x = rng.integers(0, 2, n)
+        elif t == 'Ordinal':
+            x = rng.integers(0, nv, n)
+        elif t == 'Nominal':
+            x = rng.integers(1, nv + 1, n)
+        elif t == 'Numeric':
+            lo, hi, decimals = value_range(codes)
+            x = rng.uniform(lo, hi, n).round(1) if decimals else \
+                rng.integers(lo, hi + 1, n)
+        else:
+            x = rng.integers(0, 4, n)
+        cols[v] = with_codes(rng, x, codes, share)
+
+    # Participant-level fields.
+    autopsied = rng.random(nsub) < 0.35
+    birthyr = rng.integers(1915, 1955, nsub)
+    firstyr = rng.integers(2005, 2015, nsub)
+    lastyr = firstyr + nvisits - 1
+    cols['NACCID'] = np.array(['NACC%06d' % i for i in
+        range(first_id, next_id)])[sub]
+    cols['BIRTHYR'] = birthyr[sub]
+    cols['BIRTHMO'] = rng.integers(1, 13, nsub)[sub]
+    cols['SEX'] = rng.integers(1, 3, nsub)[sub]
+    cols['EDUC'] = rng.integers(8, 21, nsub)[sub]
+    cols['VISITYR'] = firstyr[sub] + visitno
+    cols['VISITMO'] = rng.integers(1, 13, n)
+    cols['VISITDAY'] = rng.integers(1, 29, n)
+    cols['NACCAGE'] = cols['VISITYR'] - cols['BIRTHYR']
+    cols['DECAGE'] = np.where(rng.random(nsub) < 0.8,
+        rng.integers(55, 85, nsub), 888)[sub]
+    cols['NACCYOD'] = np.where(autopsied, lastyr + rng.integers(1, 3, nsub),
+        8888)[sub]
+    cols['NACCMOD'] = np.where(autopsied, rng.integers(1, 13, nsub), 88)[sub]
+    cols['NACCAUTP'] = np.where(autopsied, 1, 8)[sub]
+    for v, p in [('DOWNS', .005), ('HUNT', .005), ('PRION', .005)]:
+        cols[v] = (rng.random(nsub) < p).astype('int64')[sub]
+    for v in ['MSAIF', 'NEOPIF', 'SCHIZOIF']:
+        cols[v] = np.where(rng.random(nsub) < .01, 1, -4)[sub]
+
+    # Neuropathology, for participants with autopsy data.
+    for v in npvar.Variable:
+        values, p = npcodes.get(v, npgeneric)
+        x = rng.choice(np.array(values), nsub, p = p)
+        cols[v] = np.where(autopsied, x, -4)[sub]
+    cols['NPWBRWT'] = np.where(autopsied, rng.integers(900, 1600, nsub),
+        -4)[sub]
+    cols['NPPMIH'] = np.where(autopsied, rng.uniform(2, 48, nsub).round(1),
+        -4)[sub]
+
+    # Drugs: the first few of DRUG1..DRUG40 are filled in.
+    ndrugs = np.minimum(rng.poisson(5, n), len(drugvar))
+    names = np.array(drugnames + [''], dtype = object)
+    for j, v in enumerate(drugvar):
+        x = names[rng.integers(0, len(drugnames), n)]
+        x[ndrugs <= j] = ''
+        cols[v] = x
+
+    # Free text, mostly blank.
+    for v in textvar:
+        if v in drugvar or v in idvar:
+            continue
+        values = np.array([''] + textvalues.get(v, ['other', 'unknown']),
+            dtype = object)
+        x = values[rng.integers(1, len(values), n)]
+        x[rng.random(n) < 0.9] = ''
+        cols[v] = x
+
+    order = list(dict.fromkeys([*idvar, *xvar.Variable, *npvar.Variable,
+        *datevar, *selectvar, *drugvar, *textvar]))
+    return pd.DataFrame({v: cols[v] for v in order if v in cols}), next_id
+
+def write_visits(path, n, xvar_path = 'xvar.csv', seed = 0,
+    chunksize = 100000):
+    # Write n synthetic visits to path, chunk by chunk. Participants do not
+    # straddle chunks.
+    rng = np.random.default_rng(seed)
+    xvar = pd.read_csv(xvar_path)
+    next_id = 0
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline = '') as f:
+        for start in range(0, n, chunksize):
+            frame, next_id = visit_frame(rng, min(chunksize, n - start),
+                xvar, next_id)
+            frame.to_csv(f, header = start == 0, index = False)
+    os.replace(tmp, path)
+
+if __name__ == '__main__':
+    n = int(sys.argv[1])
+    path = sys.argv[2] if len(sys.argv) > 2 else 'synthetic_nacc.csv'
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    write_visits(path, n, seed = seed)
@@ -0,0 +1,189 @@
+'''
+Cross-validation and hyperparameter search for the tree ensembles.
+
+The classifiers are one-vs-rest ensembles of trees with balanced class
+weights, like the study's WOVR classifier: make_model builds one from a
+configuration such as
+
+    {'ensemble': 'rf', 'n_estimators': 300, 'max_depth': None,
+     'min_samples_leaf': 1, 'max_features': 'sqrt'}
+
+search fits every configuration of a grid on every cross-validation fold
+(see splits.py), and once more on the whole CV part to score it on the
+validation part (reported as fold 'val'). The feature matrix is published
+once as a float32 .npy file and memory-mapped, and the fits run in a pool of
+forked worker processes that read it in place: only a configuration and a
+fold number go to each worker, and only scores come back, so nothing the
+size of X is pickled. Each worker fits on one core.
+
+Each finished fit is appended to results.jsonl in the search directory with
+its scores and time, keyed by its configuration, fold and a key of the data
+(a hash of X's contents, y and the folds). A rerun of the same search skips
+the fits already there, so an interrupted search picks up where it stopped,
+while a search on changed features or splits starts afresh.
+
+Usage, on the freeze state of data_prep.py or freeze.py, with the splits
+kept in it (see splits.py):
+
+    python tuning.py [search directory] [--nproc N]
+'''
+
+# Module imports
+import os
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import multiprocessing
+import pandas as pd
+import numpy as np
+from scipy import sparse
+import cache
+
+# Default grid: every combination of these values is tried.
+grid = {'ensemble': ['rf', 'et'],
+    'n_estimators': [300],
+    'max_depth': [None, 12],
+    'min_samples_leaf': [1, 5],
+    'max_features': ['sqrt']}
+
+# Feature matrix, classes and folds shared with worker processes, set by
+# share_data.
+shared = {}
+
+def share_data(X, y, folds):
+    shared['X'] = X
+    shared['y'] = y
+    shared['folds'] = folds
+
+def configurations(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in
+        itertools.product(*[grid[k] for k in keys])]
+
+def make_model(config):
+    # One-vs-rest tree ensemble with balanced class weights, on one core.
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+    from sklearn.multiclass import OneVsRestClassifier
+    ensembles = {'rf': RandomForestClassifier, 'et': ExtraTreesClassifier}
+    params = dict(config)
+    ensemble = ensembles[params.pop('ensemble', 'rf')]
+    params.setdefault('class_weight', 'balanced')
+    params.setdefault('random_state', 0)
+    return OneVsRestClassifier(ensemble(n_jobs = 1, **params))
+
+def publish(X, path, chunksize = 10000):
+    # X as a float32 .npy file at path, memory-mapped. A float32 memory map
+    # is used as it is.
+    if isinstance(X, np.memmap) and X.dtype == np.float32:
+        return X
+    out = np.lib.format.open_memmap(path, mode = 'w+', dtype = 'float32',
+        shape = X.shape)
+    for i in range(0, X.shape[0], chunksize):
+        block = X[i:i + chunksize]
+        out[i:i + chunksize] = block.toarray() if sparse.issparse(block) \
+            else block
+    out.flush()
+    return np.load(path, mmap_mode = 'r')
+
+def scores(y, pred):
+    from sklearn.metrics import accuracy_score, balanced_accuracy_score, f1_score
+    return {'accuracy': accuracy_score(y, pred),
+        'balanced_accuracy': balanced_accuracy_score(y, pred),
+        'f1_macro': f1_score(y, pred, average = 'macro')}
+
+def fit_task(task):
+    # Fit one configuration on one fold; returns its result line.
+    config, fold = task
+    train, test = shared['folds'][fold]
+    X, y = shared['X'], shared['y']
+    t = time.perf_counter()
+    model = make_model(config).fit(X[train], y[train])
+    result = {'config': config, 'fold': fold, 'n_train': len(train),
+        'n_test': len(test), **scores(y[test], model.predict(X[test]))}
+    result['seconds'] = time.perf_counter() - t
+    return result
+
+def matrix_digest(X, chunksize = 10000):
+    # Hash of the contents of X (as published), a block of rows at a time.
+    h = hashlib.blake2b(digest_size = 20)
+    h.update(str(X.shape).encode())
+    for i in range(0, X.shape[0], chunksize):
+        h.update(np.ascontiguousarray(X[i:i + chunksize]).tobytes())
+    return h.hexdigest()
+
+def data_key(X, y, folds):
+    return cache.cache_key(matrix_digest(X), np.ascontiguousarray(y).tobytes(),
+        *[np.ascontiguousarray(x).tobytes() for f in sorted(folds, key = str)
+        for x in folds[f]])
+
+def task_key(config, fold):
+    return json.dumps([config, fold], sort_keys = True)
+
+def search(X, y, folds, rows_cv, rows_val, out_dir = 'search', grid = grid,
+    nproc = None):
+    # Results of every configuration of the grid on every fold (and 'val'),
+    # one row each; fits already in out_dir/results.jsonl are not redone.
+    os.makedirs(out_dir, exist_ok = True)
+    X = publish(X, os.path.join(out_dir, 'X.npy'))
+    y = np.asarray(y)
+    folds = dict(enumerate(folds))
+    folds['val'] = (np.asarray(rows_cv), np.asarray(rows_val))
+    key = data_key(X, y, folds)
+    path = os.path.join(out_dir, 'results.jsonl')
+    done = []
+    if os.path.exists(path):
+        with open(path) as f:
+            done = [r for r in map(json.loads, f) if r.get('data') == key]
+    finished = set(task_key(r['config'], r['fold']) for r in done)
+    tasks = [(config, fold) for config in configurations(grid)
+        for fold in folds if task_key(config, fold) not in finished]
+    nproc = min(nproc or os.cpu_count() or 1, max(len(tasks), 1))
+    share_data(X, y, folds)
+    pool = None
+    try:
+        if nproc > 1:
+            pool = multiprocessing.get_context('fork').Pool(nproc)
+            results = pool.imap_unordered(fit_task, tasks)
+        else:
+            results = map(fit_task, tasks)
+        with open(path, 'a') as f:
+            for result in results:
+                result['data'] = key
+                f.write(json.dumps(result) + '\n')
+                f.flush()
+                done.append(result)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        shared.clear()
+    return pd.DataFrame(done).drop(columns = ['data'], errors = 'ignore')
+
+def summary(results):
+    # Mean and standard deviation of each score over the CV folds, and the
+    # validation scores, by configuration, best balanced accuracy first.
+    results = results.assign(config = results.config.map(lambda c:
+        json.dumps(c, sort_keys = True)))
+    metrics = ['accuracy', 'balanced_accuracy', 'f1_macro']
+    cv = results.loc[results.fold != 'val'].groupby('config')[metrics]
+    table = pd.concat([cv.mean().add_suffix('_mean'), cv.std().add_suffix('_sd'),
+        results.loc[results.fold == 'val'].set_index('config')[metrics]
+        .add_suffix('_val')], axis = 1)
+    return table.sort_values('balanced_accuracy_mean', ascending = False)
+
+if __name__ == '__main__':
+    from freeze import load_state
+    from splits import splits_from_parts
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out_dir', nargs = '?', default = 'search')
+    parser.add_argument('--state', default = 'freeze')
+    parser.add_argument('--nproc', type = int)
+    args = parser.parse_args()
+    state = load_state(args.state)
+    # The splits kept with the state's rows, which follow it through updates.
+    rows, folds = splits_from_parts(state['rows'].part, state['rows'].fold)
+    results = search(state['X'], state['rows'].Class.to_numpy(), folds,
+        rows['cv'], rows['val'], args.out_dir, nproc = args.nproc)
+    with pd.option_context('display.width', 160, 'display.max_colwidth', 80):
+        print(summary(results).round(3).to_string())
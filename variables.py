@@ -0,0 +1,241 @@
+'''
+Variable lists shared by the NACC data preparation scripts.
+
+npvar holds the neuropathology variables used to build the pathology class
+outcomes. The remaining lists name the identifier, date and free-text fields
+that the loader needs to know about in addition to those listed in xvar.csv.
+'''
+
+# Module imports
+import pandas as pd
+import numpy as np
+
+# Variables from the NACC neuropathology table that will be used to group
+# individuals by pathology class:
+#    1) Alzheimer's disease (AD);
+#    2) frontotemporal lobar degeneration due to tauopathy (FTLD-tau)
+#    3) frontotemporal lobar degeneration due to TDP-43 (FTLD-TDP)
+#    4) Lewy body disease due to alpha synuclein (including Lewy body dementia and Parkinson's disease)
+#    5) vascular disease
+# Path classes: AD (ABC criteria); FTLD-tau; FTLD-TDP, including ALS; Lewy body disease (are PD patients captured here?); vascular
+npvar = pd.DataFrame(np.array(["NPPMIH",0, # Postmortem interval--keep in as a potential confound variable?
+    "NPFIX",0,
+    "NPFIXX",0,
+    "NPWBRWT",0,
+    "NPWBRF",0,
+    "NACCBRNN",0,
+    "NPGRCCA",0,
+    "NPGRLA",0,
+    "NPGRHA",0,
+    "NPGRSNH",0,
+    "NPGRLCH",0,
+    "NACCAVAS",0,
+    "NPTAN",False,
+    "NPTANX",False,
+    "NPABAN",False,
+    "NPABANX",False,
+    "NPASAN",False,
+    "NPASANX",False,
+    "NPTDPAN",False,
+    "NPTDPANX",False,
+    "NPHISMB",False,
+    "NPHISG",False,
+    "NPHISSS",False,
+    "NPHIST",False,
+    "NPHISO",False,
+    "NPHISOX",False,
+    "NPTHAL",False,# Use for ABC scoring to create ordinal measure of AD change
+    "NACCBRAA",False,# Use for ABC scoring to create ordinal measure of AD change
+    "NACCNEUR",False,# Use for ABC scoring to create ordinal measure of AD change
+    "NPADNC",False,# Use for ABC scoring to create ordinal measure of AD change
+    "NACCDIFF",False,
+    "NACCVASC",False,# Vasc presence/absence
+    "NACCAMY",False,
+    "NPLINF",False,
+    "NPLAC",False,
+    "NPINF",False,# Derived variable summarizing several assessments of infarcts and lacunes
+    "NPINF1A",False,
+    "NPINF1B",False,
+    "NPINF1D",False,
+    "NPINF1F",False,
+    "NPINF2A",False,
+    "NPINF2B",False,
+    "NPINF2D",False,
+    "NPINF2F",False,
+    "NPINF3A",False,
+    "NPINF3B",False,
+    "NPINF3D",False,
+    "NPINF3F",False,
+    "NPINF4A",False,
+    "NPINF4B",False,
+    "NPINF4D",False,
+    "NPINF4F",False,
+    "NACCINF",False,
+    "NPHEM",False,
+    "NPHEMO",False,
+    "NPHEMO1",False,
+    "NPHEMO2",False,
+    "NPHEMO3",False,
+    "NPMICRO",False,
+    "NPOLD",False,
+    "NPOLD1",False,
+    "NPOLD2",False,
+    "NPOLD3",False,
+    "NPOLD4",False,
+    "NACCMICR",False,# Derived variable for microinfarcts
+    "NPOLDD",False,
+    "NPOLDD1",False,
+    "NPOLDD2",False,
+    "NPOLDD3",False,
+    "NPOLDD4",False,
+    "NACCHEM",False,# Derived variables for microbleeds and hemorrhages
+    "NACCARTE",False,
+    "NPWMR",False,
+    "NPPATH",False,# Other ischemic/vascular pathology
+    "NACCNEC",False,
+    "NPPATH2",False,
+    "NPPATH3",False,
+    "NPPATH4",False,
+    "NPPATH5",False,
+    "NPPATH6",False,
+    "NPPATH7",False,
+    "NPPATH8",False,
+    "NPPATH9",False,
+    "NPPATH10",False,
+    "NPPATH11",False,
+    "NPPATHO",False,
+    "NPPATHOX",False,
+    "NPART",False,
+    "NPOANG",False,
+    "NACCLEWY",False,# Note that limbic/transitional and amygdala-predominant are not differentiated
+    "NPLBOD",False,# But here they are differentiated!
+    "NPNLOSS",False,
+    "NPHIPSCL",False,
+    "NPSCL",False,
+    "NPFTDTAU",False,# FTLD-tau
+    "NACCPICK",False,# FTLD-tau
+    "NPFTDT2",False,# FTLD-tau
+    "NACCCBD",False,# FTLD-tau
+    "NACCPROG",False,# FTLD-tau
+    "NPFTDT5",False,# FTLD-tau
+    "NPFTDT6",False,# FTLD-tau
+    "NPFTDT7",False,# FTLD-tau
+    "NPFTDT8",False,# This is FTLD-tau but associated with ALS/parkinsonism--wut?
+    "NPFTDT9",False,# tangle-dominant disease--is this PART? Maybe exclude cases who have this as only path type.
+    "NPFTDT10",False,# FTLD-tau: other 3R+4R tauopathy. What is this if not AD? Maybe exclude. How many cases?
+    "NPFRONT",False,# FTLD-tau
+    "NPTAU",False,# FTLD-tau
+    "NPFTD",False,# FTLD-TDP
+    "NPFTDTDP",False,# FTLD-TDP
+    "NPALSMND",False,# FTLD-TDP (but exclude FUS and SOD1)
+    "NPOFTD",False,
+    "NPOFTD1",False,
+    "NPOFTD2",False,
+    "NPOFTD3",False,
+    "NPOFTD4",False,
+    "NPOFTD5",False,
+    "NPFTDNO",False,
+    "NPFTDSPC",False,
+    "NPTDPA",False,# In second pass, use anatomical distribution to stage 
+    "NPTDPB",False,# In second pass, use anatomical distribution to stage
+    "NPTDPC",False,# In second pass, use anatomical distribution to stage
+    "NPTDPD",False,# In second pass, use anatomical distribution to stage
+    "NPTDPE",False,# In second pass, use anatomical distribution to stage
+    "NPPDXA",False,# Exclude?
+    "NPPDXB",False,# Exclude
+    "NACCPRIO",False,# Exclude
+    "NPPDXD",False,# Exclude
+    "NPPDXE",False,
+    "NPPDXF",False,
+    "NPPDXG",False,
+    "NPPDXH",False,
+    "NPPDXI",False,
+    "NPPDXJ",False,
+    "NPPDXK",False,
+    "NPPDXL",False,
+    "NPPDXM",False,
+    "NPPDXN",False,
+    "NACCDOWN",False,
+    "NACCOTHP",False,# Survey for exclusion criteria
+    "NACCWRI1",False,# Survey for exclusion criteria
+    "NACCWRI2",False,# Survey for exclusion criteria
+    "NACCWRI3",False,# Survey for exclusion criteria
+    "NACCBNKF",False,
+    "NPBNKB",False,
+    "NACCFORM",False,
+    "NACCPARA",False,
+    "NACCCSFP",False,
+    "NPBNKF",False,
+    "NPFAUT",False,
+    "NPFAUT1",False,
+    "NPFAUT2",False,
+    "NPFAUT3",False,
+    "NPFAUT4",False,
+    "NACCINT",False,
+    "NPNIT",False,
+    "NPCERAD",False,# What sort of variable?
+    "NPADRDA",False,
+    "NPOCRIT",False,
+    "NPVOTH",False,
+    "NPLEWYCS",False,
+    "NPGENE",True,# Family history--include in predictors?
+    "NPFHSPEC",False,# Code as dummy variables if useful.
+    "NPCHROM",False,# Exclusion factor? Genetic/chromosomal abnormalities
+    "NPPNORM",False,# Check all the following variables for redundancy with the ones above.
+    "NPCNORM",False,
+    "NPPADP",False,
+    "NPCADP",False,
+    "NPPAD",False,
+    "NPCAD",False,
+    "NPPLEWY",False,
+    "NPCLEWY",False,
+    "NPPVASC",False,
+    "NPCVASC",False,
+    "NPPFTLD",False,
+    "NPCFTLD",False,
+    "NPPHIPP",False,
+    "NPCHIPP",False,
+    "NPPPRION",False,
+    "NPCPRION",False,
+    "NPPOTH1",False,
+    "NPCOTH1",False,
+    "NPOTH1X",False,
+    "NPPOTH2",False,
+    "NPCOTH2",False,
+    "NPOTH2X",False,
+    "NPPOTH3",False,
+    "NPCOTH3",False,
+    "NPOTH3X",0]).reshape((-1,2)))
+npvar.columns = ['Variable','Keep']
+
+# Identifier and date-part fields. These are read even when xvar.csv marks
+# them for exclusion, since visits are keyed and dated with them.
+idvar = ['NACCID']
+datevar = ['BIRTHYR','BIRTHMO','NACCYOD','NACCMOD','VISITYR','VISITMO','VISITDAY']
+
+# Fields needed for case selection.
+selectvar = ['NACCAUTP','DOWNS','HUNT','PRION','MSAIF','NEOPIF','SCHIZOIF']
+
+# Medications, one column per reported drug.
+drugvar = ['DRUG' + str(i) for i in range(1,41)]
+
+# Free-text fields. Everything else in the investigator file is a numeric
+# code. Several UDS variables end in X but are coded (SEX, ANX, BEANX,
+# ARTUPEX, ...), so these are listed out rather than matched on the name.
+textvar = [*idvar, *drugvar,
+    'HISPORX','RACEX','RACESECX','RACETERX','PRIMLANX','INHISPOX','INRACEX',
+    'INRASECX','INRATERX','INRELTOX','NACCAMX','NACCAMSX','NACCFMX',
+    'NACCFMSX','NACCOMX','NACCOMSX','CVOTHRX','NCOTHRX','ARTHTYPX',
+    'OTHSLEEX','ABUSX','PSYCDISX','CVDIMAGX','SPEECHX',
+    'FACEXPX','TRESTFAX','TRESTRHX','TRESTLHX','TRESTRFX','TRESTLFX',
+    'TRACTRHX','TRACTLHX','RIGDNEX','RIGDUPRX','RIGDUPLX','RIGDLORX',
+    'RIGDLOLX','TAPSRTX','TAPSLFX','HANDMVRX','HANDMVLX','HANDATRX',
+    'HANDATLX','LEGRTX','LEGLFX','ARISINGX','POSTUREX','GAITX','POSSTABX',
+    'BRADYKIX','NPIQINFX','OTHNEURX','COGOTHRX','NACCCGFX','COGMODEX',
+    'BEOTHRX','NACCBEFX','BEMODEX','MOMODEX','MMSELANX','NPSYLANX',
+    'MOCALANX','OTHBIOMX','OTHMUTX','FTLDSUBX','OTHCOGX','OTHPSYX',
+    'COGOTHX','COGOTH2X','COGOTH3X','ARTYPEX','SLEEPOTX','ANTIENCX',
+    'OTHCONDX',
+    'NPFIXX','NPTANX','NPABANX','NPASANX','NPTDPANX','NPHISOX','NPPATHOX',
+    'NPFHSPEC','NPFAUT1','NPFAUT2','NPFAUT3','NPFAUT4','NACCWRI1',
+    'NACCWRI2','NACCWRI3','NPOTH1X','NPOTH2X','NPOTH3X']